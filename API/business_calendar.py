@@ -0,0 +1,198 @@
+import os
+import numpy as np
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from datetime import date, datetime, timedelta
+
+######################################################################
+#      Business-day arithmetic
+######################################################################
+
+# Optional holiday calendar: comma-separated YYYY-MM-DD dates that are not business days (none by default)
+BUSINESS_HOLIDAYS = [h.strip() for h in os.getenv("PMO_BUSINESS_HOLIDAYS", "").split(",") if h.strip()]
+
+# Weekdays counted in the first `r` days of a week that starts on weekday `w` (Monday = 0)
+_PARTIAL_WEEK_WEEKDAYS = [[sum(1 for k in range(r) if (w + k) % 7 < 5) for r in range(7)] for w in range(7)]
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+def weekday_count(start, end):
+    """
+    Number of Monday-Friday days between start and end (inclusive) in constant time; 0 when end < start.
+    """
+    start, end = _to_date(start), _to_date(end)
+    span = (end - start).days + 1
+    if span <= 0:
+        return 0
+    weeks, rest = divmod(span, 7)
+    return weeks * 5 + _PARTIAL_WEEK_WEEKDAYS[start.weekday()][rest]
+
+class BusinessCalendar:
+    """
+    Monday-Friday business days minus an optional set of holidays. Scalar counts are closed-form (plus a bisect over
+    the holidays); the batch methods take arrays of dates and use numpy's busday functions.
+    All ranges are inclusive of both ends.
+    """
+
+    def __init__(self, holidays=()):
+        self.holidays = sorted({_to_date(h) for h in holidays if _to_date(h).weekday() < 5})
+        self.busdaycalendar = np.busdaycalendar(weekmask='1111100', holidays=np.array(self.holidays, dtype='datetime64[D]'))
+
+    def count(self, start, end):
+        """
+        Business days between start and end.
+        """
+        start, end = _to_date(start), _to_date(end)
+        count = weekday_count(start, end)
+        if count and self.holidays:
+            count -= bisect_right(self.holidays, end) - bisect_left(self.holidays, start)
+        return count
+
+    def counts(self, starts, ends):
+        """
+        Business days of each (start, end) pair, as an int array; 0 for empty ranges.
+        """
+        starts = np.asarray(starts, dtype='datetime64[D]')
+        ends = np.asarray(ends, dtype='datetime64[D]')
+        counts = np.busday_count(starts, ends + 1, busdaycal=self.busdaycalendar)
+        return np.where(ends >= starts, counts, 0)
+
+    def days(self, start, end):
+        """
+        Business days between start and end as a datetime64[D] array.
+        """
+        days = np.arange(np.datetime64(_to_date(start), 'D'), np.datetime64(_to_date(end), 'D') + 1, dtype='datetime64[D]')
+        return days[np.is_busday(days, busdaycal=self.busdaycalendar)]
+
+business_calendar = BusinessCalendar(BUSINESS_HOLIDAYS)
+
+def merge_ranges(ranges):
+    """
+    Merge (start, end) date ranges (inclusive) into sorted, non-overlapping ranges; ranges that touch are joined.
+    Returns the starts and the ends as two lists of dates.
+    """
+    starts, ends = [], []
+    for start, end in sorted((_to_date(start), _to_date(end)) for start, end in ranges):
+        if starts and start <= ends[-1] + timedelta(days=1):
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+class TimeoffIndex:
+    """
+    Time off per resource as sorted, merged (non-overlapping) date ranges. Built once per request from time off rows,
+    it answers is_off with a bisect, off_days with a bisect plus a vectorized count, and mask with a searchsorted.
+    A day covered by several overlapping time off rows counts once.
+    """
+
+    def __init__(self, timeoffs, calendar=business_calendar, key='resource_id', start_key='timeoff_start_date', end_key='timeoff_end_date'):
+        self.calendar = calendar
+        ranges = {}
+        for row in timeoffs:
+            if row[start_key] is not None and row[end_key] is not None:
+                ranges.setdefault(row[key], []).append((_to_date(row[start_key]), _to_date(row[end_key])))
+
+        # {resource: (starts, ends)} as sorted lists (for bisect) and datetime64[D] arrays (for vectorized lookups)
+        self.ranges = {}
+        self.arrays = {}
+        for resource_id, resource_ranges in ranges.items():
+            starts, ends = merge_ranges(resource_ranges)
+            self.ranges[resource_id] = (starts, ends)
+            self.arrays[resource_id] = (np.array(starts, dtype='datetime64[D]'), np.array(ends, dtype='datetime64[D]'))
+
+    def is_off(self, resource_id, day):
+        """
+        Whether the resource has time off on the day.
+        """
+        starts, ends = self.ranges.get(resource_id, ((), ()))
+        day = _to_date(day)
+        i = bisect_right(starts, day) - 1
+        return i >= 0 and ends[i] >= day
+
+    def off_days(self, resource_id, start, end):
+        """
+        Business days between start and end (inclusive) on which the resource has time off.
+        """
+        if resource_id not in self.ranges:
+            return 0
+        starts, ends = self.ranges[resource_id]
+        start, end = _to_date(start), _to_date(end)
+        # Ranges that can overlap [start, end]: the one containing start and those starting up to end
+        lo = max(bisect_right(starts, start) - 1, 0)
+        hi = bisect_right(starts, end)
+        if lo >= hi:
+            return 0
+        range_starts, range_ends = self.arrays[resource_id]
+        clipped_starts = np.maximum(range_starts[lo:hi], np.datetime64(start, 'D'))
+        clipped_ends = np.minimum(range_ends[lo:hi], np.datetime64(end, 'D'))
+        return int(self.calendar.counts(clipped_starts, clipped_ends).sum())
+
+    def mask(self, resource_id, days):
+        """
+        Boolean array: True for each day (datetime64[D] array) on which the resource has time off.
+        """
+        days = np.asarray(days, dtype='datetime64[D]')
+        if resource_id not in self.arrays:
+            return np.zeros(len(days), dtype=bool)
+        starts, ends = self.arrays[resource_id]
+        i = np.searchsorted(starts, days, side='right') - 1
+        return (i >= 0) & (ends[i.clip(0)] >= days)
+
+######################################################################
+#      Calendar periods (weekly, monthly and quarterly buckets)
+######################################################################
+
+# Months per period for the month-based intervals
+PERIOD_MONTHS = {'Monthly': 1, 'Quarterly': 3}
+
+@lru_cache(maxsize=1024)
+def _period_bounds(start, end, interval):
+    first, last = np.datetime64(start, 'D'), np.datetime64(end, 'D')
+    if last < first:
+        starts = ends = np.array([], dtype='datetime64[D]')
+        return starts, ends
+    if interval == 'Weekly':
+        monday = first - start.weekday()
+        starts = np.arange(monday, last + 1, 7, dtype='datetime64[D]')
+    else:
+        step = PERIOD_MONTHS[interval]
+        first_month = first.astype('datetime64[M]')
+        first_month -= first_month.astype(int) % step
+        starts = np.arange(first_month, last.astype('datetime64[M]') + 1, step, dtype='datetime64[M]').astype('datetime64[D]')
+    ends = np.append(starts[1:] - 1, last)
+    starts = np.maximum(starts, first)
+    starts.flags.writeable = False
+    ends.flags.writeable = False
+    return starts, ends
+
+def period_bounds(start, end, interval):
+    """
+    (starts, ends) datetime64[D] arrays of the Monday-Sunday weeks ('Weekly'), calendar months ('Monthly') or
+    quarters ('Quarterly') overlapping start..end, clamped to it. Cached per (start, end, interval); read-only.
+    """
+    return _period_bounds(_to_date(start), _to_date(end), interval)
+
+def period_offsets(days, starts):
+    """
+    Index in `days` (a sorted datetime64[D] array) of the first day of each period: the segment boundaries of
+    period_sums for consecutive periods.
+    """
+    return np.searchsorted(days, np.asarray(starts, dtype='datetime64[D]'))
+
+def period_sums(values, offsets):
+    """
+    Sum of `values` (one row per day, any trailing axes) over each segment starting at `offsets`, in one reduceat
+    pass; the last segment runs to the end and empty segments sum to 0.
+    """
+    values = np.asarray(values)
+    offsets = np.asarray(offsets, dtype=np.intp)
+    sums = np.zeros((len(offsets),) + values.shape[1:], dtype=values.dtype if values.dtype != bool else np.int64)
+    if len(values) and len(offsets):
+        filled = np.diff(np.append(offsets, len(values))) > 0
+        sums[filled] = np.add.reduceat(values, offsets[filled], axis=0)
+    return sums
@@ -0,0 +1,250 @@
+from datetime import datetime
+import numpy as np
+from capacity_engine import CapacityBatch, allocation_details, run_lengths, to_hours
+from business_calendar import period_bounds, period_offsets
+from capacity_pool import unpack_rows
+from utils import convert_decimal_to_float
+
+######################################################################
+#      Capacity allocation responses (no database access, so process-pool workers can import this module)
+######################################################################
+
+def capacity_periods(days, start_date, end_date, interval):
+    """
+    (starts, ends) of the /resource_capacity_allocation periods over a business-day axis: every Monday-Sunday
+    week clamped to the range ('Weekly'), or the calendar months with business days, the first and last of them
+    stretched to the start and end dates ('Monthly').
+    """
+    starts, ends = period_bounds(start_date, end_date, interval)
+    if interval == 'Monthly':
+        has_days = np.diff(np.append(period_offsets(days, starts), len(days))) > 0
+        starts, ends = starts[has_days].copy(), ends[has_days].copy()
+        if len(starts):
+            starts[0], ends[-1] = start_date, end_date
+    return starts, ends
+
+def capacity_period_entries(starts, ends, period_totals, interval, project_names):
+    """
+    /resource_capacity_allocation entries of Weekly or Monthly periods from their (totals, project hours) pairs.
+    """
+    entries = []
+    for period_start, period_end, (totals, project_hours) in zip(starts, ends, period_totals):
+        capacity = totals["total_capacity"]
+        if interval == 'Weekly':
+            # Avoid division by zero
+            capacity = capacity if capacity > 0 else 0.001
+        entries.append({
+            "start_date": str(period_start),
+            "end_date": str(period_end),
+            **totals,
+            "project_allocation_details": allocation_details(project_hours, capacity, project_names)
+        })
+    return entries
+
+def round_capacity_entry(entry):
+    """
+    Round the float hour fields of a capacity entry to one decimal, in place.
+    """
+    for k in entry:
+        if k in [
+            "total_capacity", "total_capacity_cumulative",
+            "allocation_hours_planned", "allocation_hours_actual",
+            "available_capacity", "available_capacity_cumulative",
+            "cumulative_planned", "cumulative_actual"
+        ] and isinstance(entry[k], float):
+            entry[k] = round(entry[k], 1)
+    return entry
+
+def capacity_resource_details(resource):
+    """
+    The resource_details of a /resource_capacity_allocation response.
+    """
+    return {
+        "resource_id": resource['resource_id'],
+        "resource_name": resource['resource_name'],
+        "resource_email": resource['resource_email'],
+        "resource_type": resource['resource_type'],
+        "strategic_portfolio": resource['strategic_portfolio'],
+        "product_line": resource['product_line'],
+        "manager_name": resource['manager_name'],
+        "manager_email": resource['manager_email'],
+        "resource_role": resource['resource_role'],
+        "responsibility": resource['responsibility'],
+        "skillset": resource['skillset'],
+        "comments": resource['comments'],
+        "yearly_capacity": resource['yearly_capacity'],
+        "timesheet_resource_name": resource['timesheet_resource_name']
+    }
+
+def build_resource_capacity_allocation(resource, engine, start_date_obj, end_date_obj, interval):
+    """
+    Build the /resource_capacity_allocation response (resource details and weekly, monthly or block intervals)
+    for one resource from its capacity engine view.
+    """
+    resource_details = capacity_resource_details(resource)
+
+    # Always convert to blocks regardless of interval type for consistency
+    # First, build intervals as before but with consistent date format
+    intervals = []
+
+    if interval in ('Weekly', 'Monthly'):
+        # --- Calendar periods: Monday-Sunday weeks or calendar months, clamped to the user's dates ---
+        starts, ends = capacity_periods(engine.days, start_date_obj, end_date_obj, interval)
+        intervals = capacity_period_entries(starts, ends, engine.period_totals(starts), interval, engine.project_names)
+    elif not interval:
+        # --- Blocks: runs of business days with the same per-day project details ---
+        present, planned, actual, signature = engine.daily_details()
+        for block_start, block_stop in run_lengths(signature):
+            block_days = slice(block_start, block_stop)
+            block_total_capacity = to_hours(int(engine.capacity[block_days].sum()))
+
+            # Per-project hours are the day-rounded values summed over the block (in day order)
+            columns = np.flatnonzero(present[block_start])
+            block_planned = np.cumsum(planned[block_days, columns], axis=0)[-1].tolist() if len(columns) else []
+            block_actual = np.cumsum(actual[block_days, columns], axis=0)[-1].tolist() if len(columns) else []
+
+            block_project_details = []
+            total_planned_from_projects = 0
+            total_actual_from_projects = 0
+            for column, project_planned, project_actual in zip(columns, block_planned, block_actual):
+                project_id = engine.project_ids[column]
+                planned_rounded = round(project_planned, 1)
+                actual_rounded = round(project_actual, 1)
+                block_project_details.append({
+                    'project_id': project_id,
+                    'project_name': engine.project_names.get(project_id, "Unknown Project"),
+                    'planned_hours': planned_rounded,
+                    'actual_hours': actual_rounded,
+                    'planned_percentage': round((planned_rounded / block_total_capacity * 100) if block_total_capacity > 0 else 0, 2),
+                    'actual_percentage': round((actual_rounded / block_total_capacity * 100) if block_total_capacity > 0 else 0, 2)
+                })
+                total_planned_from_projects += planned_rounded
+                total_actual_from_projects += actual_rounded
+
+            # Use the sum of rounded project values for consistency
+            intervals.append({
+                "start_date": str(engine.days[block_start]),
+                "end_date": str(engine.days[block_stop - 1]),
+                "total_capacity": round(block_total_capacity, 1),
+                "allocation_hours_planned": round(total_planned_from_projects, 1),
+                "allocation_hours_actual": round(total_actual_from_projects, 1),
+                "available_capacity": round(block_total_capacity - total_planned_from_projects, 1),
+                "project_allocation_details": block_project_details
+            })
+    else:
+        # Daily intervals
+        for i, day in enumerate(engine.days):
+            day_str = str(day)
+            totals = engine.totals(slice(i, i + 1))
+            intervals.append({
+                "start_date": day_str,
+                "end_date": day_str,
+                **totals,
+                "project_allocation_details": engine.project_allocation_details(slice(i, i + 1), totals["total_capacity"])
+            })
+    result = intervals
+
+    # --- Round only at the end ---
+    result = [round_capacity_entry(entry) for entry in result]
+    result = convert_decimal_to_float(result)
+
+    # Create final response with resource details at top level
+    response = {
+        "resource_details": resource_details,
+        "data": result
+    }
+    return response
+
+def project_capacity_entries(engine, project_id, start_date_obj, end_date_obj, interval):
+    """
+    The entries of build_resource_capacity_allocation reduced to what the project view reads:
+    (start_date, end_date, total_capacity, available_capacity, share) with the capacity rounded as the response
+    rounds it, and share the project's (planned_hours, actual_hours) detail, or None when the project has no
+    allocation or actual in the entry. Only the project's own column is broken down.
+    """
+    column = engine.project_ids.index(project_id) if project_id in engine.project_ids else None
+    entries = []
+    if interval in ('Weekly', 'Monthly'):
+        starts, ends = capacity_periods(engine.days, start_date_obj, end_date_obj, interval)
+        capacity, available, planned, actual, present = engine.project_period_totals(starts, column)
+        for i, (period_start, period_end) in enumerate(zip(starts, ends)):
+            share = (round(planned[i], 2), round(actual[i], 2)) if present[i] else None
+            entries.append((str(period_start), str(period_end), round(capacity[i], 1), round(available[i], 1), share))
+    elif not interval:
+        # Blocks are the runs of days with the same details over every project, as in build_resource_capacity_allocation
+        present, planned, actual, signature = engine.daily_details()
+        for block_start, block_stop in run_lengths(signature):
+            block_days = slice(block_start, block_stop)
+            block_total_capacity = to_hours(int(engine.capacity[block_days].sum()))
+            columns = np.flatnonzero(present[block_start])
+            block_planned = np.cumsum(planned[block_days, columns], axis=0)[-1].tolist() if len(columns) else []
+            total_planned_from_projects = 0
+            for project_planned in block_planned:
+                total_planned_from_projects += round(project_planned, 1)
+            share = None
+            if column is not None and present[block_start, column]:
+                block_actual = np.cumsum(actual[block_days, column])[-1]
+                share = (round(block_planned[list(columns).index(column)], 1), round(float(block_actual), 1))
+            entries.append((str(engine.days[block_start]), str(engine.days[block_stop - 1]), round(block_total_capacity, 1),
+                            round(block_total_capacity - total_planned_from_projects, 1), share))
+    else:
+        # Daily intervals
+        for i, day in enumerate(engine.days):
+            totals = engine.totals(slice(i, i + 1))
+            share = None
+            if column is not None and engine.present[i, column]:
+                share = (round(to_hours(int(engine.planned[i, column])), 2), round(to_hours(int(engine.actual[i, column])), 2))
+            entries.append((str(day), str(day), round(totals["total_capacity"], 1), round(totals["available_capacity"], 1), share))
+    return entries
+
+def capacity_batch(resources, start_date_obj, end_date_obj, tables):
+    """
+    CapacityBatch of fetched resource rows and their tables ([facts] or [timeoffs, allocations, actuals]),
+    with the ids of the resources holding an allocation.
+    """
+    daily_capacities = {resource['resource_id']: resource['yearly_capacity'] / 261 for resource in resources}  # 261 weekdays in a year
+    if len(tables) == 1:
+        facts = tables[0]
+        batch = CapacityBatch.from_facts(start_date_obj.date(), end_date_obj.date(), daily_capacities, facts)
+        return batch, {fact['resource_id'] for fact in facts if fact['is_planned']}
+    timeoffs, allocations, actuals = tables
+    batch = CapacityBatch(start_date_obj.date(), end_date_obj.date(), daily_capacities, allocations, actuals, timeoffs)
+    return batch, {allocation['resource_id'] for allocation in allocations}
+
+def compute_capacity_allocations(resources, start_date, end_date, interval, project_id, *tables):
+    """
+    One engine pass over fetched resource rows and their tables (see capacity_batch).
+    Returns {resource_id: response} as get_resource_capacity_allocations does.
+    """
+    start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
+    end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
+    batch, allocated = capacity_batch(resources, start_date_obj, end_date_obj, tables)
+
+    # If project_id filter is specified, resources without allocations get an empty array
+    results = {}
+    for resource in resources:
+        resource_id = resource['resource_id']
+        if project_id is not None and resource_id not in allocated:
+            results[resource_id] = []
+        else:
+            results[resource_id] = build_resource_capacity_allocation(
+                resource, batch.resource(resource_id), start_date_obj, end_date_obj, interval)
+    return results
+
+def compute_project_capacity(resources, start_date, end_date, interval, project_id, *tables):
+    """
+    One engine pass over fetched resource rows and their tables (every project's rows, see capacity_batch).
+    Returns {resource_id: project_capacity_entries()}.
+    """
+    start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
+    end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
+    batch, _ = capacity_batch(resources, start_date_obj, end_date_obj, tables)
+    return {resource['resource_id']: project_capacity_entries(
+        batch.resource(resource['resource_id']), project_id, start_date_obj, end_date_obj, interval) for resource in resources}
+
+def compute_capacity_chunk(compute, start_date, end_date, interval, project_id, resources, *tables):
+    """
+    Process-pool entry point of a compute function (compute_capacity_allocations or compute_project_capacity):
+    the rows arrive packed (see capacity_pool.pack_rows).
+    """
+    return compute(unpack_rows(resources), start_date, end_date, interval, project_id, *(unpack_rows(table) for table in tables))
@@ -0,0 +1,309 @@
+import numpy as np
+from business_calendar import business_calendar, TimeoffIndex, period_offsets, period_sums
+
+######################################################################
+#      Vectorized capacity calculations
+######################################################################
+
+# Fixed-point hours: the engine counts hours in int64 units of 1 / HOUR_UNITS hour. A daily capacity is
+# yearly_capacity / 261 hours, so with 261 * 10^6 units per hour a daily capacity, a percentage of it, a weekly
+# allocation / 5 and a timesheet entry (up to four decimals each) are whole numbers of units, and the sums over
+# any period are exact. Hours become floats only at the output boundary (to_hours), so periods round as the
+# exact Decimal sums did.
+HOUR_UNITS = 261_000_000
+
+def to_units(hours):
+    """
+    Hours (a number or a sequence of them) as the nearest whole number of fixed-point units (int64).
+    """
+    return np.rint(np.asarray(hours, dtype=float) * HOUR_UNITS).astype(np.int64)
+
+def to_hours(units):
+    """
+    Fixed-point units (an int or an int64 array) as float hours.
+    """
+    return units / HOUR_UNITS
+
+def to_day(value):
+    return np.datetime64(value, 'D') if value is not None else np.datetime64('NaT', 'D')
+
+def interval_mask(days, rows, start_key, end_key):
+    """
+    days x rows boolean matrix: True where the day falls inside the row's [start, end] date range.
+    """
+    starts = np.array([to_day(row[start_key]) for row in rows], dtype='datetime64[D]')
+    ends = np.array([to_day(row[end_key]) for row in rows], dtype='datetime64[D]')
+    return (days[:, None] >= starts[None, :]) & (days[:, None] <= ends[None, :])
+
+def fold_columns(matrix, keys, ufunc):
+    """
+    Combine the columns of `matrix` that share a key with `ufunc` (np.add, np.logical_or).
+    Returns the distinct keys (sorted) and the folded matrix with one column per key.
+    """
+    order = np.argsort(keys, kind='stable')
+    keys = np.asarray(keys)[order]
+    distinct, first = np.unique(keys, return_index=True)
+    return distinct, ufunc.reduceat(matrix[:, order], first, axis=1)
+
+def run_lengths(signatures):
+    """
+    Run-length encode a sequence of per-day (or per-interval) signatures in one pass: (start, stop) index pairs of
+    the runs of equal consecutive signatures. Signatures are the rows of an array, compared element-wise, or any
+    hashable keys.
+    """
+    if not isinstance(signatures, np.ndarray):
+        keys = {}
+        signatures = np.array([keys.setdefault(signature, len(keys)) for signature in signatures], dtype=int)
+    if not len(signatures):
+        return []
+    if signatures.ndim == 1:
+        signatures = signatures[:, None]
+    changed = (signatures[1:] != signatures[:-1]).any(axis=1)
+    bounds = np.concatenate(([0], np.flatnonzero(changed) + 1, [len(signatures)]))
+    return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+def python_round(values, digits):
+    """
+    Python's round() of every element (np.round rounds some halves differently), evaluated once per distinct value.
+    """
+    distinct, inverse = np.unique(values, return_inverse=True)
+    return np.array([round(value, digits) for value in distinct.tolist()], dtype=float)[inverse].reshape(values.shape)
+
+class CapacityBatch:
+    """
+    Capacity of several resources over one business-day axis. Planned and actual hours are day x column matrices
+    of fixed-point units (see HOUR_UNITS) with one column per (resource, project) pair; time off is a day x resource mask. All resources are computed in
+    one pass, and resource(resource_id) returns a single resource's view of the matrices.
+    """
+
+    def __init__(self, start_date, end_date, daily_capacities, allocations, actuals, timeoffs):
+        self._set_axes(start_date, end_date, daily_capacities, list(allocations) + list(actuals))
+        resource_index, column = self.resource_index, self.column
+
+        # Planned: days x allocations interval mask, folded onto (resource, project) columns
+        if allocations and len(self.days):
+            pct = np.array([float(a['allocation_pct'] or 0) for a in allocations])
+            capacity = np.array([self.daily_units[a['resource_id']] for a in allocations], dtype=np.int64)
+            weekly = to_units([float(a['allocation_hrs_per_week'] or 0) / 5 for a in allocations])
+            daily_units = np.where(pct != 0, np.rint(capacity * pct / 100).astype(np.int64), weekly)
+            covered = interval_mask(self.days, allocations, 'allocation_start_date', 'allocation_end_date')
+            keys = [column[(a['resource_id'], a['project_id'])] for a in allocations]
+            cols, planned = fold_columns(covered * daily_units, keys, np.add)
+            self.planned[:, cols] = planned
+            self.planned_mask[:, cols] = fold_columns(covered, keys, np.logical_or)[1]
+
+        # Actual: scatter timesheet rows onto the business days they fall on (weekend entries are dropped)
+        if actuals and len(self.days):
+            entry_days = np.array([to_day(row['ts_entry_date']) for row in actuals], dtype='datetime64[D]')
+            index = np.searchsorted(self.days, entry_days).clip(0, len(self.days) - 1)
+            on_axis = self.days[index] == entry_days
+            rows = index[on_axis]
+            cols = np.array([column[(row['resource_id'], row['project_id'])] for row in actuals])[on_axis]
+            hours = to_units([float(row['allocation_hours_actual'] or 0) for row in actuals])[on_axis]
+            np.add.at(self.actual, (rows, cols), hours)
+            self.actual_mask[rows, cols] = True
+
+        # Time off: any period of the resource covering the day
+        if timeoffs and len(self.days):
+            timeoff_index = TimeoffIndex(timeoffs)
+            for resource_id in timeoff_index.ranges:
+                self.timeoff[:, resource_index[resource_id]] = timeoff_index.mask(resource_id, self.days)
+
+    @classmethod
+    def from_facts(cls, start_date, end_date, daily_capacities, facts):
+        """
+        Batch read from pmo.resource_day_fact rows (see resource_day_fact.py) instead of the raw allocation,
+        timesheet and time off rows: every (resource, day, project) value is already materialized.
+        """
+        batch = cls.__new__(cls)
+        batch._set_axes(start_date, end_date, daily_capacities, [row for row in facts if row['is_planned'] or row['is_actual']])
+        if facts and len(batch.days):
+            fact_days = np.array([to_day(row['fact_date']) for row in facts], dtype='datetime64[D]')
+            index = np.searchsorted(batch.days, fact_days).clip(0, len(batch.days) - 1)
+            on_axis = batch.days[index] == fact_days
+
+            # Time off from the resource rows, hours from the rows with an allocation or timesheet entry
+            timeoff = on_axis & np.array([bool(row['is_timeoff']) for row in facts], dtype=bool)
+            resources = np.array([batch.resource_index[row['resource_id']] for row in facts], dtype=int)
+            batch.timeoff[index[timeoff], resources[timeoff]] = True
+
+            booked = [i for i, row in enumerate(facts) if on_axis[i] and (row['is_planned'] or row['is_actual'])]
+            if booked:
+                rows = index[booked]
+                cols = np.array([batch.column[(facts[i]['resource_id'], facts[i]['project_id'])] for i in booked], dtype=int)
+                batch.planned[rows, cols] = to_units([float(facts[i]['planned_hours']) for i in booked])
+                batch.planned_mask[rows, cols] = [bool(facts[i]['is_planned']) for i in booked]
+                batch.actual[rows, cols] = to_units([float(facts[i]['actual_hours']) for i in booked])
+                batch.actual_mask[rows, cols] = [bool(facts[i]['is_actual']) for i in booked]
+        return batch
+
+    def _set_axes(self, start_date, end_date, daily_capacities, rows):
+        # Business-day axis, resources, and one column per (resource_id, project_id) pair of `rows`, with empty matrices
+        self.days = business_calendar.days(start_date, end_date)
+        self.daily_units = {resource_id: int(to_units(capacity)) for resource_id, capacity in daily_capacities.items()}
+        self.resource_ids = list(self.daily_units)
+        self.resource_index = resource_index = {resource_id: i for i, resource_id in enumerate(self.resource_ids)}
+
+        # Columns grouped by resource: (resource_id, project_id) pairs sorted by resource, then project
+        pairs = {(row['resource_id'], row['project_id']) for row in rows}
+        self.columns = sorted(pairs, key=lambda pair: (resource_index[pair[0]], pair[1] is None, pair[1]))
+        self.column = {pair: i for i, pair in enumerate(self.columns)}
+        self.project_names = {}
+        for row in rows:
+            if row['project_id'] and row['project_name']:
+                self.project_names[row['project_id']] = row['project_name']
+
+        shape = (len(self.days), len(self.columns))
+        self.planned = np.zeros(shape, dtype=np.int64)
+        self.planned_mask = np.zeros(shape, dtype=bool)
+        self.actual = np.zeros(shape, dtype=np.int64)
+        self.actual_mask = np.zeros(shape, dtype=bool)
+        self.timeoff = np.zeros((len(self.days), len(self.resource_ids)), dtype=bool)
+
+        # Column range of each resource
+        column_resources = np.array([resource_index[resource_id] for resource_id, _ in self.columns], dtype=int)
+        bounds = np.searchsorted(column_resources, np.arange(len(self.resource_ids) + 1))
+        self.column_ranges = {resource_id: slice(int(bounds[i]), int(bounds[i + 1])) for i, resource_id in enumerate(self.resource_ids)}
+
+    def resource(self, resource_id):
+        """
+        Capacity view of one resource of the batch.
+        """
+        columns = self.column_ranges[resource_id]
+        return ResourceCapacityEngine(
+            self.days, self.daily_units[resource_id],
+            [project_id for _, project_id in self.columns[columns]], self.project_names,
+            self.planned[:, columns], self.planned_mask[:, columns],
+            self.actual[:, columns], self.actual_mask[:, columns],
+            self.timeoff[:, self.resource_index[resource_id]]
+        )
+
+class ResourceCapacityEngine:
+    """
+    One resource's capacity over a business-day axis, with planned and actual hours held as day x project matrices.
+    Every per-day array is in fixed-point units; totals(), project_hours() and daily_details() return hours.
+
+    Daily semantics match the original per-day loop:
+    - planned hours of an allocation apply on every weekday inside its date range, as a percentage of the daily
+      capacity or as allocation_hrs_per_week / 5
+    - used hours take a project's actual hours when they are positive, otherwise its planned hours
+    - time off zeroes the capacity and used hours of a day, but not its planned and actual hours
+    - allocation_hours_planned only counts projects without an actual entry on that day
+    """
+
+    def __init__(self, days, daily_units, project_ids, project_names, planned, planned_mask, actual, actual_mask, timeoff):
+        self.days = days
+        self.daily_units = daily_units
+        self.project_ids = project_ids
+        self.project_names = project_names
+        self.planned = planned
+        self.actual = actual
+        self.timeoff = timeoff
+
+        # Per-day totals
+        self.capacity = np.where(timeoff, 0, daily_units)
+        used = np.where(actual_mask & (actual > 0), actual, planned).sum(axis=1)
+        self.used = np.where(timeoff, 0, used)
+        self.planned_hours = np.where(actual_mask, 0, planned).sum(axis=1)
+        self.actual_hours = actual.sum(axis=1)
+        self.available = self.capacity - self.used
+        self.present = planned_mask | actual_mask
+
+    def totals(self, days):
+        """
+        Capacity, planned, actual and available hours summed over a day slice.
+        """
+        return {
+            "total_capacity": to_hours(self.daily_units * int((~self.timeoff[days]).sum())),
+            "allocation_hours_planned": to_hours(int(self.planned_hours[days].sum())),
+            "allocation_hours_actual": to_hours(int(self.actual_hours[days].sum())),
+            "available_capacity": to_hours(int(self.available[days].sum()))
+        }
+
+    def project_hours(self, days):
+        """
+        (project_id, planned hours, actual hours) for the projects with an allocation or actual in a day slice.
+        """
+        present = self.present[days].any(axis=0)
+        planned = self.planned[days].sum(axis=0)
+        actual = self.actual[days].sum(axis=0)
+        return [(self.project_ids[i], to_hours(int(planned[i])), to_hours(int(actual[i]))) for i in np.flatnonzero(present)]
+
+    def period_totals(self, starts):
+        """
+        totals() and project_hours() of consecutive periods, with one segment-sum pass per array: `starts` are the
+        periods' first days (see business_calendar.period_bounds) and each period runs up to the next one's start.
+        Returns a (totals, project hours) pair per period.
+        """
+        offsets = period_offsets(self.days, starts)
+        working_days = period_sums(~self.timeoff, offsets)
+        planned_hours = period_sums(self.planned_hours, offsets)
+        actual_hours = period_sums(self.actual_hours, offsets)
+        available = period_sums(self.available, offsets)
+        present = period_sums(self.present, offsets) > 0
+        planned = period_sums(self.planned, offsets)
+        actual = period_sums(self.actual, offsets)
+        return [({
+            "total_capacity": to_hours(self.daily_units * int(working_days[i])),
+            "allocation_hours_planned": to_hours(int(planned_hours[i])),
+            "allocation_hours_actual": to_hours(int(actual_hours[i])),
+            "available_capacity": to_hours(int(available[i]))
+        }, [(self.project_ids[j], to_hours(int(planned[i, j])), to_hours(int(actual[i, j]))) for j in np.flatnonzero(present[i])])
+            for i in range(len(offsets))]
+
+    def project_period_totals(self, starts, column):
+        """
+        Capacity and available hours of consecutive periods (as period_totals) with the planned and actual hours of
+        one project column, without breaking down the other projects; column None is a project without rows.
+        Returns lists of hours (capacity, available, planned, actual) and of the project's presence per period.
+        """
+        offsets = period_offsets(self.days, starts)
+        capacity = to_hours(self.daily_units * period_sums(~self.timeoff, offsets))
+        available = to_hours(period_sums(self.available, offsets))
+        if column is None:
+            zeros = [0.0] * len(offsets)
+            return capacity.tolist(), available.tolist(), zeros, zeros, [False] * len(offsets)
+        planned = to_hours(period_sums(self.planned[:, column], offsets))
+        actual = to_hours(period_sums(self.actual[:, column], offsets))
+        present = period_sums(self.present[:, column], offsets) > 0
+        return capacity.tolist(), available.tolist(), planned.tolist(), actual.tolist(), present.tolist()
+
+    def daily_details(self):
+        """
+        Per-day project details as day x project arrays, rounded as project_allocation_details rounds a single day
+        (with that day's capacity): (present, planned hours, actual hours, signature). Two days have equal detail
+        lists exactly when their signature rows are equal.
+        """
+        capacity = to_hours(self.capacity)[:, None]
+        planned, actual = to_hours(self.planned), to_hours(self.actual)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            planned_percentage = np.where(capacity > 0, planned / capacity * 100, 0.0)
+            actual_percentage = np.where(capacity > 0, actual / capacity * 100, 0.0)
+        present = self.present
+        planned = np.where(present, python_round(planned, 2), 0.0)
+        actual = np.where(present, python_round(actual, 2), 0.0)
+        signature = np.concatenate([
+            present, planned, actual,
+            np.where(present, python_round(planned_percentage, 2), 0.0),
+            np.where(present, python_round(actual_percentage, 2), 0.0)
+        ], axis=1)
+        return present, planned, actual, signature
+
+    def project_allocation_details(self, days, capacity):
+        """
+        Per-project planned/actual hours and their share of `capacity` over a day slice.
+        """
+        return allocation_details(self.project_hours(days), capacity, self.project_names)
+
+def allocation_details(project_hours, capacity, project_names):
+    """
+    Allocation detail entries of (project_id, planned hours, actual hours) tuples, with percentages of `capacity`.
+    """
+    return [{
+        "project_id": project_id,
+        "project_name": project_names.get(project_id, "Unknown Project"),
+        "planned_hours": round(planned, 2),
+        "actual_hours": round(actual, 2),
+        "planned_percentage": round((planned / capacity * 100) if capacity > 0 else 0, 2),
+        "actual_percentage": round((actual / capacity * 100) if capacity > 0 else 0, 2)
+    } for project_id, planned, actual in project_hours]
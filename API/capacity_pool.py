@@ -0,0 +1,66 @@
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from utils import record_class
+
+######################################################################
+#      Process pool for CPU-bound capacity rollups
+######################################################################
+
+# Worker processes computing capacity batches in parallel (1 computes every batch in the request's process)
+CAPACITY_WORKERS = int(os.getenv("PMO_CAPACITY_WORKERS", os.cpu_count() or 1))
+# Resources per chunk: batches of up to this many resources are computed in the request's process
+CAPACITY_CHUNK_SIZE = int(os.getenv("PMO_CAPACITY_CHUNK_SIZE", 50))
+
+# Persistent pool, started on first use and shut down with the application
+capacity_pool = None
+
+def pack_rows(rows):
+    """
+    Compact, picklable form of query rows (utils.Record or dict rows): (columns, list of value tuples).
+    """
+    if not rows:
+        return (), []
+    columns = tuple(rows[0].keys())
+    return columns, [tuple(row[column] for column in columns) for row in rows]
+
+def unpack_rows(packed):
+    """
+    Rows of pack_rows() output as utils.Record rows.
+    """
+    columns, values = packed
+    record = record_class(columns)
+    return [record(row) for row in values]
+
+def chunk_count(items):
+    """
+    Number of chunks to split `items` resources into: 1 (no pool) for small batches or a single worker.
+    """
+    if CAPACITY_WORKERS <= 1 or items <= CAPACITY_CHUNK_SIZE:
+        return 1
+    return min(CAPACITY_WORKERS, -(-items // CAPACITY_CHUNK_SIZE))
+
+def get_capacity_pool():
+    global capacity_pool
+    if capacity_pool is None:
+        # Spawned workers behave the same on every platform and do not inherit the server's threads or connections
+        capacity_pool = ProcessPoolExecutor(max_workers=CAPACITY_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        print(f"Capacity process pool started with {CAPACITY_WORKERS} workers.")  # Log success
+    return capacity_pool
+
+async def map_capacity_chunks(function, chunks):
+    """
+    Run function(*chunk) for every chunk in the worker processes and return the results in chunk order.
+    `function` must be a module-level function and the chunks picklable (see pack_rows).
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_capacity_pool()
+    return await asyncio.gather(*(loop.run_in_executor(pool, function, *chunk) for chunk in chunks))
+
+def close_capacity_pool():
+    global capacity_pool
+    if capacity_pool is not None:
+        capacity_pool.shutdown(cancel_futures=True)
+        capacity_pool = None
+        print("Capacity process pool closed.")  # Log message
@@ -0,0 +1,198 @@
+import os
+import time
+import asyncio
+import psycopg
+from datetime import date
+from psycopg.types.json import Json
+from business_calendar import business_calendar
+from db_utils_pg_async import pg_async_connection, fetch_one
+
+######################################################################
+#      Precomputed portfolio capacity rollups (pmo.capacity_snapshot)
+######################################################################
+
+# Seconds between checks for writes to the capacity tables (0 disables the snapshots)
+CAPACITY_SNAPSHOT_POLL_SECONDS = float(os.getenv("PMO_CAPACITY_SNAPSHOT_POLL_SECONDS", 30))
+# Seconds between scheduled full rebuilds, whether or not anything was written
+CAPACITY_SNAPSHOT_REFRESH_SECONDS = float(os.getenv("PMO_CAPACITY_SNAPSHOT_REFRESH_SECONDS", 3600))
+
+# Tables the portfolio rollup reads: every statement writing one of them bumps pmo.capacity_data_version_seq
+CAPACITY_SOURCE_TABLES = ["resources", "projects", "resource_allocation", "timeoff", "timesheet_entry"]
+
+# Snapshots are looked up once the tables exist and the refresh task runs in this process
+capacity_snapshots_enabled = False
+_refresh_task = None
+
+CAPACITY_SNAPSHOT_DDL = """
+    -- Change counter of the rollup's source tables, drawn by the triggers below: a sequence takes no row lock,
+    -- so concurrent writers do not queue on it. Each writing transaction also holds a shared advisory lock from
+    -- its bump to its commit, which lets the refresh wait out the writes its version already counts.
+    -- The version is last_value once nextval was called, 0 before.
+    DROP TABLE IF EXISTS pmo.capacity_data_version;  -- the counter row of earlier versions
+    CREATE SEQUENCE IF NOT EXISTS pmo.capacity_data_version_seq;
+    CREATE OR REPLACE FUNCTION pmo.bump_capacity_data_version() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        PERFORM pg_advisory_xact_lock_shared(hashtext('pmo.capacity_data_version'));
+        PERFORM nextval('pmo.capacity_data_version_seq');
+        RETURN NULL;
+    END
+    $$;
+    -- One /resource_capacity_allocation_per_portfolio response per filter x interval x range ('' = no filter)
+    CREATE TABLE IF NOT EXISTS pmo.capacity_snapshot (
+        strategic_portfolio text NOT NULL,
+        product_line text NOT NULL,
+        interval text NOT NULL,
+        start_date date NOT NULL,
+        end_date date NOT NULL,
+        response json NOT NULL,
+        PRIMARY KEY (strategic_portfolio, product_line, interval, start_date, end_date)
+    );
+    -- The data version, holiday calendar and years the snapshots were computed for
+    CREATE TABLE IF NOT EXISTS pmo.capacity_snapshot_state (
+        data_version bigint NOT NULL,
+        holidays date[] NOT NULL,
+        start_date date NOT NULL,
+        end_date date NOT NULL,
+        refreshed_at timestamp NOT NULL DEFAULT now()
+    );
+""" + "".join(f"""
+    CREATE OR REPLACE TRIGGER capacity_data_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON pmo.{table}
+    FOR EACH STATEMENT EXECUTE FUNCTION pmo.bump_capacity_data_version();
+""" for table in CAPACITY_SOURCE_TABLES)
+
+# The snapshot of a request, only while no write happened since it was computed
+CAPACITY_SNAPSHOT_LOOKUP = """
+    SELECT s.response, st.refreshed_at
+    FROM pmo.capacity_snapshot s
+    CROSS JOIN pmo.capacity_snapshot_state st
+    CROSS JOIN pmo.capacity_data_version_seq v
+    WHERE s.strategic_portfolio = %s AND s.product_line = %s AND s.interval = %s
+      AND s.start_date = %s AND s.end_date = %s
+      AND st.data_version = CASE WHEN v.is_called THEN v.last_value ELSE 0 END AND st.holidays = %s::date[]
+"""
+
+def snapshot_ranges():
+    """
+    Date ranges kept as snapshots: the current and the next calendar year.
+    """
+    year = date.today().year
+    return [(date(year, 1, 1), date(year, 12, 31)), (date(year + 1, 1, 1), date(year + 1, 12, 31))]
+
+async def fetch_capacity_snapshot(strategic_portfolio, product_line, start_date, end_date, interval):
+    """
+    The snapshot response of a portfolio rollup request (with its refreshed_at timestamp as snapshot_refreshed_at),
+    or None when snapshots are off, the request does not match a snapshot or the snapshot is stale.
+    """
+    if not capacity_snapshots_enabled or interval not in ('Weekly', 'Monthly'):
+        return None
+    ranges = {(start.isoformat(), end.isoformat()): (start, end) for start, end in snapshot_ranges()}
+    if (start_date, end_date) not in ranges:
+        return None
+    try:
+        row = await fetch_one(CAPACITY_SNAPSHOT_LOOKUP, (
+            strategic_portfolio or '', product_line or '', interval, *ranges[(start_date, end_date)], business_calendar.holidays))
+    except psycopg.Error as e:
+        print(f"Capacity snapshot lookup failed: {e}")  # Log the error
+        return None
+    if row is None:
+        return None
+    response = row['response']
+    response["strategic_portfolio"] = strategic_portfolio
+    response["product_line"] = product_line
+    response["snapshot_refreshed_at"] = row['refreshed_at'].isoformat()
+    return response
+
+async def refresh_capacity_snapshots(build, force=False):
+    """
+    Recompute the snapshots with build(start_date, end_date) (see resources.portfolio_capacity_snapshots) when the
+    source tables changed since the last refresh, the years moved or the holidays differ, or always with force.
+    One process refreshes at a time (advisory lock); the others skip. The data version is read before build reads
+    any data, so a write that commits during the refresh leaves the snapshots stale rather than wrong. The version
+    is only read while no transaction that drew it is still uncommitted (see CAPACITY_SNAPSHOT_DDL); while writes
+    are in flight the refresh waits for the next poll.
+    """
+    ranges = snapshot_ranges()
+    async with pg_async_connection(readonly=False) as conn:
+        if conn is None:
+            print("Capacity snapshot refresh skipped: database connection failed")  # Log message
+            return
+        cursor = conn.cursor()
+        # The exclusive lock lasts only this short transaction: writers wait at most for the version read
+        async with conn.transaction():
+            await cursor.execute("SELECT pg_try_advisory_xact_lock(hashtext('pmo.capacity_data_version'))")
+            if not (await cursor.fetchone())[0]:
+                return
+            await cursor.execute("SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM pmo.capacity_data_version_seq")
+            (data_version,) = await cursor.fetchone()
+        async with conn.transaction():
+            await cursor.execute("SELECT pg_try_advisory_xact_lock(hashtext('pmo.capacity_snapshot'))")
+            if not (await cursor.fetchone())[0]:
+                return
+            await cursor.execute("SELECT data_version, holidays, start_date, end_date FROM pmo.capacity_snapshot_state")
+            state = (data_version, business_calendar.holidays, ranges[0][0], ranges[-1][1])
+            if not force and await cursor.fetchone() == state:
+                return
+
+            started = time.perf_counter()
+            rows = []
+            for start_date, end_date in ranges:
+                for strategic_portfolio, product_line, interval, response in await build(start_date.isoformat(), end_date.isoformat()):
+                    rows.append((strategic_portfolio, product_line, interval, start_date, end_date, Json(response)))
+            await cursor.execute("DELETE FROM pmo.capacity_snapshot")
+            await cursor.executemany("""
+                INSERT INTO pmo.capacity_snapshot (strategic_portfolio, product_line, interval, start_date, end_date, response)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, rows)
+            await cursor.execute("DELETE FROM pmo.capacity_snapshot_state")
+            await cursor.execute(
+                "INSERT INTO pmo.capacity_snapshot_state (data_version, holidays, start_date, end_date) VALUES (%s, %s::date[], %s, %s)",
+                state)
+    print(f"Capacity snapshots refreshed: {len(rows)} rollups in {time.perf_counter() - started:.1f}s")  # Log success
+
+async def _refresh_loop(build):
+    # Refresh right away, then after writes (polling the data version) and on the full-rebuild schedule
+    last_rebuild = time.monotonic()
+    while True:
+        force = time.monotonic() - last_rebuild >= CAPACITY_SNAPSHOT_REFRESH_SECONDS
+        try:
+            await refresh_capacity_snapshots(build, force)
+        except Exception as e:
+            print(f"Capacity snapshot refresh failed: {e}")  # Log the error
+        if force:
+            last_rebuild = time.monotonic()
+        await asyncio.sleep(CAPACITY_SNAPSHOT_POLL_SECONDS)
+
+async def open_capacity_snapshots(build):
+    """
+    Create the snapshot tables and the version triggers if needed, then start the background refresh task and
+    enable snapshot reads. On failure the snapshots stay disabled and every request computes its rollup.
+    """
+    global capacity_snapshots_enabled, _refresh_task
+    if CAPACITY_SNAPSHOT_POLL_SECONDS <= 0:
+        return
+    async with pg_async_connection(readonly=False) as conn:
+        if conn is None:
+            print("Capacity snapshots disabled: database connection failed")  # Log message
+            return
+        try:
+            async with conn.transaction():
+                cursor = conn.cursor()
+                await cursor.execute("SELECT pg_advisory_xact_lock(hashtext('pmo.capacity_snapshot_ddl'))")
+                await cursor.execute(CAPACITY_SNAPSHOT_DDL)
+        except psycopg.Error as e:
+            print(f"Capacity snapshots disabled: {e}")  # Log the error
+            return
+    _refresh_task = asyncio.create_task(_refresh_loop(build))
+    capacity_snapshots_enabled = True
+    print("Capacity snapshots enabled")  # Log success
+
+async def close_capacity_snapshots():
+    global capacity_snapshots_enabled, _refresh_task
+    capacity_snapshots_enabled = False
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
@@ -0,0 +1,64 @@
+import asyncio
+import psycopg
+from db_utils_pg import begin_request, end_request, leased_connections
+
+class DatabaseRequestMiddleware:
+    """
+    ASGI middleware that applies the per-route database policy from db_utils_pg (replica reads, statement
+    timeout) and cancels the request's running queries when the client disconnects before the response is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        tokens, connections = begin_request(scope["method"], scope["path"])
+        messages = asyncio.Queue()
+        response_sent = False
+
+        async def watch_receive():
+            # Forward request messages to the app and return once the client disconnects
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    return
+
+        async def send_and_track(message):
+            nonlocal response_sent
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_sent = True
+            await send(message)
+
+        app_task = asyncio.create_task(self.app(scope, messages.get, send_and_track))
+        watcher = asyncio.create_task(watch_receive())
+        try:
+            await asyncio.wait({app_task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not app_task.done() and not response_sent:
+                print(f"Client disconnected, cancelling {scope['method']} {scope['path']}")  # Log message
+                await cancel_queries(connections)
+                app_task.cancel()
+                try:
+                    await app_task
+                except asyncio.CancelledError:
+                    pass
+                return
+            await app_task
+        finally:
+            watcher.cancel()
+            end_request(tokens)
+
+async def cancel_queries(connections):
+    # Ask the server to cancel whatever each leased connection is running
+    for conn in leased_connections(connections):
+        try:
+            if isinstance(conn, psycopg.AsyncConnection):
+                await conn.cancel_safe()
+            else:
+                await asyncio.to_thread(conn.cancel)
+        except Exception as e:
+            print(f"Failed to cancel query: {e}")  # Log the error
@@ -1,54 +1,589 @@
+import os
+import threading
+import time
+import weakref
+import hashlib
+import re
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from itertools import count
 import psycopg2
 from psycopg2 import OperationalError
-from psycopg2.pool import SimpleConnectionPool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, connection as base_connection, cursor as base_cursor
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import PoolError
+from utils import record_class
+
+# Connection parameters (shared with db_utils_pg_async)
+PG_CONNECTION_PARAMS = {
+    "host": "127.0.0.1",  # Host (IP address)
+    "port": 5432,  # Port
+    "user": "postgres",  # Username
+    "password": "admin123",  # Password
+    "dbname": "pmodb"  # Database name
+}
+
+# Pool sizing and connection hygiene (shared with db_utils_pg_async), overridable via environment
+PG_POOL_SETTINGS = {
+    "min_size": int(os.environ.get("PMO_PG_POOL_MIN_SIZE", 1)),  # Connections kept open when idle
+    "max_size": int(os.environ.get("PMO_PG_POOL_MAX_SIZE", 20)),  # Hard cap on open connections
+    "acquire_timeout": float(os.environ.get("PMO_PG_POOL_ACQUIRE_TIMEOUT", 10)),  # Seconds a caller may queue for a connection
+    "max_lifetime": float(os.environ.get("PMO_PG_POOL_MAX_LIFETIME", 1800)),  # Seconds before a connection is recycled
+    "max_idle": float(os.environ.get("PMO_PG_POOL_MAX_IDLE", 300)),  # Seconds an idle connection above min_size is kept
+    "check_after": float(os.environ.get("PMO_PG_POOL_CHECK_AFTER", 30))  # Pre-ping connections idle for longer than this
+}
+
+# Read replicas as comma-separated libpq DSNs (shared with db_utils_pg_async); reads use the primary when unset
+PG_REPLICA_DSNS = [dsn.strip() for dsn in os.environ.get("PMO_PG_REPLICA_DSNS", "").split(",") if dsn.strip()]
+
+# Per-route read/write policy: GET routes read from the replicas and every other method uses the primary
+# (/allocate, /timesheet/upsert, the imports, ...), except for the routes listed here
+PRIMARY_GET_ROUTES = {
+    "/allocations/next_allocation_id"  # Reserves the ID with an INSERT
+}
+REPLICA_POST_ROUTES = {
+    "/screener_projects",
+    "/screener_resources",
+    "/screener_resource_capacity_allocation",
+    "/projects/dynamic_filter"
+}
+_read_only_request = ContextVar("pg_read_only_request", default=False)
+
+# statement_timeout budgets in milliseconds per route class, overridable via PMO_PG_STATEMENT_TIMEOUT_<CLASS>;
+# "background" covers work outside any request (snapshot refreshes, the day-fact rebuild at startup)
+STATEMENT_TIMEOUTS = {
+    route_class: int(os.environ.get(f"PMO_PG_STATEMENT_TIMEOUT_{route_class.upper()}", default))
+    for route_class, default in {"default": 30000, "reporting": 120000, "screener": 30000, "import": 600000,
+                                 "background": 1800000}.items()
+}
+# Route class by path prefix (first match wins); unmatched routes are "default"
+ROUTE_CLASSES = [
+    ("/excel_to_db", "import"),
+    ("/allocations_actual/import_timesheet", "import"),
+    ("/screener_", "screener"),
+    ("/projects/dynamic_filter", "screener"),
+    ("/resource_capacity", "reporting"),
+    ("/project_capacity_allocation", "reporting")
+]
+_statement_timeout = ContextVar("pg_statement_timeout", default=None)
+_request_connections = ContextVar("pg_request_connections", default=None)  # Connections leased by the current request
+_request_connections_lock = threading.Lock()  # Worker threads lease while the middleware may be cancelling
+_session_timeouts = weakref.WeakKeyDictionary()  # connection -> statement_timeout currently set on its session
+
+# Rows fetched per round trip by streaming (server-side) cursors (shared with db_utils_pg_async)
+PG_STREAM_FETCH_SIZE = int(os.environ.get("PMO_PG_STREAM_FETCH_SIZE", 2000))
+_stream_cursor_ids = count(1)
+
+# Query instrumentation (shared with db_utils_pg_async): queries slower than the threshold go to a ring buffer
+# served at /debug/slow_queries; EXPLAIN (ANALYZE, BUFFERS) is captured for reads slower than the explain threshold
+QUERY_LOG_SETTINGS = {
+    "slow_query_ms": float(os.environ.get("PMO_PG_SLOW_QUERY_MS", 200)),  # Threshold for the slow query log
+    "log_size": int(os.environ.get("PMO_PG_SLOW_QUERY_LOG_SIZE", 500)),  # Slow queries kept in the ring buffer
+    "explain": os.environ.get("PMO_PG_EXPLAIN_SLOW_QUERIES", "0") == "1",  # Capture plans for outliers
+    "explain_ms": float(os.environ.get("PMO_PG_EXPLAIN_MS", 1000))  # Threshold for plan capture
+}
+slow_query_log = deque(maxlen=QUERY_LOG_SETTINGS["log_size"])
+query_stats = {}  # fingerprint -> calls, total_ms, max_ms, rows
+_query_stats_lock = threading.Lock()
+_request_route = ContextVar("pg_request_route", default=None)
+_lease_wait_ms = weakref.WeakKeyDictionary()  # connection -> pool wait of its current lease
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH|EXECUTE)\b", re.IGNORECASE)
+_WRITES = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+
+def fingerprint_query(query):
+    """
+    Normalize a query to its shape: literals become ?, IN lists collapse and whitespace is squeezed.
+    """
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    shape = re.sub(r"'(?:[^']|'')*'", "?", str(query))
+    shape = re.sub(r"\b\d+(?:\.\d+)?\b", "?", shape)
+    shape = re.sub(r"\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\)", "(...)", shape)
+    return " ".join(shape.split())
+
+def should_explain(query, duration_ms):
+    return (QUERY_LOG_SETTINGS["explain"] and duration_ms >= QUERY_LOG_SETTINGS["explain_ms"]
+            and bool(_EXPLAINABLE.match(query)) and not _WRITES.search(query))
+
+def record_query(conn, query, duration_ms, rowcount, plan=None):
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    fingerprint = fingerprint_query(query)
+    if not fingerprint:
+        return
+    with _query_stats_lock:
+        stats = query_stats.setdefault(fingerprint, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0})
+        stats["calls"] += 1
+        stats["total_ms"] += duration_ms
+        stats["max_ms"] = max(stats["max_ms"], duration_ms)
+        stats["rows"] += max(rowcount or 0, 0)
+    if duration_ms >= QUERY_LOG_SETTINGS["slow_query_ms"]:
+        slow_query_log.append({
+            "timestamp": time.time(),
+            "fingerprint": fingerprint,
+            "fingerprint_id": hashlib.md5(fingerprint.encode()).hexdigest()[:12],
+            "duration_ms": round(duration_ms, 3),
+            "rows": rowcount,
+            "route": _request_route.get(),
+            "pool_wait_ms": _lease_wait_ms.get(conn),
+            "plan": plan
+        })
+
+class InstrumentedCursorMixin:
+    """
+    Times every execute() and feeds record_query; mixed into whatever cursor class the caller asked for.
+    """
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            result = super().execute(query, vars)
+        except BaseException:
+            record_query(self.connection, query, (time.perf_counter() - start) * 1000, self.rowcount)
+            raise
+        duration_ms = (time.perf_counter() - start) * 1000
+        plan = self._explain(query, vars) if should_explain(str(query), duration_ms) else None
+        record_query(self.connection, query, duration_ms, self.rowcount, plan)
+        return result
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(self.connection, query, (time.perf_counter() - start) * 1000, self.rowcount)
+
+    def _explain(self, query, vars):
+        # Re-run the read under a savepoint on an uninstrumented cursor so a failure cannot abort the route's transaction
+        explain_cursor = base_cursor(self.connection)
+        try:
+            explain_cursor.execute("SAVEPOINT explain_capture")
+            explain_cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + str(query), vars)
+            plan = "\n".join(row[0] for row in explain_cursor.fetchall())
+            explain_cursor.execute("RELEASE SAVEPOINT explain_capture")
+            return plan
+        except psycopg2.Error as e:
+            explain_cursor.execute("ROLLBACK TO SAVEPOINT explain_capture")
+            return f"EXPLAIN failed: {e}"
+        finally:
+            explain_cursor.close()
+
+@lru_cache(maxsize=None)
+def _instrumented_cursor_class(cursor_factory):
+    return type(f"Instrumented{cursor_factory.__name__}", (InstrumentedCursorMixin, cursor_factory), {})
+
+class InstrumentedConnection(base_connection):
+    """
+    psycopg2 connection whose cursors (plain, DictCursor, RealDictCursor, named) are all instrumented.
+    """
+
+    def cursor(self, *args, **kwargs):
+        cursor_factory = kwargs.get("cursor_factory") or self.cursor_factory or base_cursor
+        kwargs["cursor_factory"] = _instrumented_cursor_class(cursor_factory)
+        return super().cursor(*args, **kwargs)
+
+class RecordCursor(base_cursor):
+    """
+    Cursor returning utils.Record rows: tuples indexable by column name, without building a mapping per row.
+    """
+
+    def _record_class(self):
+        return record_class([column.name for column in self.description])
+
+    def fetchone(self):
+        row = super().fetchone()
+        return None if row is None else self._record_class()(row)
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(size) if size is not None else super().fetchmany()
+        cls = self._record_class() if rows else None
+        return [cls(row) for row in rows]
+
+    def fetchall(self):
+        rows = super().fetchall()
+        cls = self._record_class() if rows else None
+        return [cls(row) for row in rows]
+
+    def __iter__(self):
+        while True:
+            rows = self.fetchmany(self.itersize if self.name else self.arraysize)
+            if not rows:
+                return
+            yield from rows
+
+class PoolTimeout(PoolError):
+    pass
+
+class PGConnectionPool:
+    """
+    Thread-safe psycopg2 connection pool.
+    Callers queue in FIFO order for up to `acquire_timeout` seconds instead of failing when all connections are out.
+    Connections are pre-pinged after `check_after` seconds idle, recycled after `max_lifetime` seconds and
+    reaped after `max_idle` seconds idle (never below `min_size`).
+    """
+
+    def __init__(self, min_size, max_size, acquire_timeout, max_lifetime, max_idle, check_after, **conn_params):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self.conn_params = conn_params
+        self.closed = False
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, created_at, last_used_at), most recently used on the right
+        self._in_use = {}  # id(conn) -> (conn, created_at)
+        self._waiters = deque()
+        self._size = 0  # Open connections, including ones being created
+        self._stats = {"connections_opened": 0, "connections_closed": 0, "waits": 0, "timeouts": 0, "failed_checks": 0,
+                       "discarded": 0, "reconnects": 0}
+        self._broken = 0  # Broken connections discarded and not yet replaced
+
+        for _ in range(min_size):
+            self._idle.append((self._connect(), time.monotonic(), time.monotonic()))
+            self._size += 1
+
+        self._reaper = threading.Thread(target=self._reap_loop, name="pg-pool-reaper", daemon=True)
+        self._reaper.start()
+
+    def _connect(self):
+        conn = psycopg2.connect(connection_factory=InstrumentedConnection, **self.conn_params)
+        with self._cond:
+            self._stats["connections_opened"] += 1
+            # A new connection that replaces a broken one is a reconnect
+            if self._broken > 0:
+                self._broken -= 1
+                self._stats["reconnects"] += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats["connections_closed"] += 1
+
+    def _is_healthy(self, conn, created_at, last_used_at):
+        now = time.monotonic()
+        if conn.closed or now - created_at > self.max_lifetime:
+            return False
+        if now - last_used_at > self.check_after:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                with self._cond:
+                    self._stats["failed_checks"] += 1
+                    self._broken += 1
+                return False
+        return True
+
+    def getconn(self, timeout=None):
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        entry = None
+        with self._cond:
+            if self.closed:
+                raise PoolError("connection pool is closed")
+            token = object()
+            self._waiters.append(token)
+            waited = False
+            try:
+                while True:
+                    # Only the caller at the head of the queue may take a connection (fair FIFO waiting)
+                    if self._waiters[0] is token:
+                        if self._idle:
+                            entry = self._idle.pop()
+                            break
+                        if self._size < self.max_size:
+                            self._size += 1
+                            break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(f"no connection available within {timeout}s (max_size={self.max_size})")
+                    # Count one wait per blocked acquisition, not per wake-up
+                    if not waited:
+                        self._stats["waits"] += 1
+                        waited = True
+                    self._cond.wait(remaining)
+            finally:
+                self._waiters.remove(token)
+                self._cond.notify_all()
+
+        # Validate or open the connection outside the lock; the slot is already reserved for this caller
+        try:
+            if entry is not None:
+                conn, created_at, last_used_at = entry
+                if not self._is_healthy(conn, created_at, last_used_at):
+                    self._discard(conn)
+                    conn, created_at = self._connect(), time.monotonic()
+            else:
+                conn, created_at = self._connect(), time.monotonic()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify_all()
+            raise
+
+        with self._cond:
+            self._in_use[id(conn)] = (conn, created_at)
+        return conn
+
+    def putconn(self, conn, close=False):
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            raise PoolError("trying to put unkeyed connection")
+        created_at = entry[1]
+
+        # Connections closed by the caller or by a dropped socket must not go back into the pool
+        broken = conn.closed != 0
+        if not broken:
+            try:
+                if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        close = close or broken or self.closed or time.monotonic() - created_at > self.max_lifetime
+
+        with self._cond:
+            if broken:
+                self._stats["discarded"] += 1
+                self._broken += 1
+            if close:
+                self._size -= 1
+            else:
+                self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify_all()
+        if close:
+            self._discard(conn)
+
+    def _reap_idle(self):
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            kept = deque()
+            # Oldest-used connections are on the left; keep at least min_size open
+            while self._idle:
+                conn, created_at, last_used_at = self._idle.popleft()
+                too_old = now - created_at > self.max_lifetime
+                too_idle = now - last_used_at > self.max_idle and self._size - len(expired) > self.min_size
+                if conn.closed or too_old or too_idle:
+                    expired.append(conn)
+                else:
+                    kept.append((conn, created_at, last_used_at))
+            self._idle = kept
+            self._size -= len(expired)
+            if expired:
+                self._cond.notify_all()
+        for conn in expired:
+            self._discard(conn)
+
+    def _reap_loop(self):
+        interval = max(1.0, min(self.max_idle, self.max_lifetime) / 2)
+        while not self.closed:
+            time.sleep(interval)
+            try:
+                self._reap_idle()
+            except Exception as e:
+                print(f"Connection pool reaper failed: {e}")  # Log the error
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, size=self._size, idle=len(self._idle), in_use=len(self._in_use), waiting=len(self._waiters))
+
+    def closeall(self):
+        with self._cond:
+            self.closed = True
+            idle, self._idle = list(self._idle), deque()
+            in_use, self._in_use = list(self._in_use.values()), {}
+            self._size = 0
+            self._cond.notify_all()
+        for conn, *_ in idle + in_use:
+            self._discard(conn)
 
 # Initialize the connection pool
 connection_pool = None
 try:
     print("Initializing PostgreSQL connection pool...")  # Log message
-    connection_pool = SimpleConnectionPool(
-        1,  # Minimum number of connections
-        20,  # Maximum number of connections
-        host="127.0.0.1",  # Host (IP address)
-        port=5432,  # Port
-        user="postgres",  # Username
-        password="admin123",  # Password
-        database="pmodb"  # Database name
-    )
+    connection_pool = PGConnectionPool(**PG_POOL_SETTINGS, **PG_CONNECTION_PARAMS)
     if connection_pool:
         print("PostgreSQL connection pool initialized successfully.")  # Log success
 except OperationalError as e:
     print(f"Failed to initialize PostgreSQL connection pool: {e}")  # Log the error
 
-def get_pg_connection():
+# Initialize one pool per read replica
+replica_pools = []
+for dsn in PG_REPLICA_DSNS:
     try:
-        if connection_pool:
+        print("Initializing PostgreSQL read replica pool...")  # Log message
+        replica_pools.append(PGConnectionPool(**PG_POOL_SETTINGS, dsn=dsn))
+    except OperationalError as e:
+        print(f"Failed to initialize PostgreSQL read replica pool: {e}")  # Log the error
+_replica_turn = count()
+
+def route_uses_replica(method, path):
+    if method == "GET":
+        return path not in PRIMARY_GET_ROUTES
+    return method == "POST" and path in REPLICA_POST_ROUTES
+
+def route_class(path):
+    for prefix, name in ROUTE_CLASSES:
+        if path.startswith(prefix):
+            return name
+    return "default"
+
+def begin_request(method, path):
+    """
+    Apply the per-route database policy (replica reads, statement timeout) to the current request context.
+    Returns the context tokens for end_request and the set of connections the request leases.
+    """
+    connections = set()
+    tokens = (
+        _read_only_request.set(route_uses_replica(method, path)),
+        _statement_timeout.set(STATEMENT_TIMEOUTS[route_class(path)]),
+        _request_connections.set(connections),
+        _request_route.set(f"{method} {path}")
+    )
+    return tokens, connections
+
+def end_request(tokens):
+    for var, token in zip((_read_only_request, _statement_timeout, _request_connections, _request_route), tokens):
+        var.reset(token)
+
+def use_replica(readonly=None):
+    """
+    Whether a connection lease should go to a replica: explicit `readonly`, else the policy of the current request.
+    """
+    return _read_only_request.get() if readonly is None else readonly
+
+def select_pool(readonly=None):
+    # Round-robin across the replicas for reads
+    if replica_pools and use_replica(readonly):
+        return replica_pools[next(_replica_turn) % len(replica_pools)]
+    return connection_pool
+
+def current_statement_timeout():
+    # Connections leased outside a request get the background budget rather than the last request's
+    timeout = _statement_timeout.get()
+    return STATEMENT_TIMEOUTS["background"] if timeout is None else timeout
+
+def apply_statement_timeout(conn):
+    # Sessions keep their statement_timeout across leases, so only change it when the route class differs
+    timeout = current_statement_timeout()
+    if _session_timeouts.get(conn) == timeout:
+        return
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT set_config('statement_timeout', %s, false)", (str(timeout),))
+        conn.commit()
+        _session_timeouts[conn] = timeout
+    except psycopg2.Error as e:
+        print(f"Failed to set statement_timeout: {e}")  # Log the error
+
+def track_request_connection(conn, wait_ms=None):
+    _lease_wait_ms[conn] = None if wait_ms is None else round(wait_ms, 3)
+    connections = _request_connections.get()
+    if connections is not None and conn is not None:
+        with _request_connections_lock:
+            connections.add(conn)
+
+def untrack_request_connection(conn):
+    connections = _request_connections.get()
+    if connections is not None:
+        with _request_connections_lock:
+            connections.discard(conn)
+
+def leased_connections(connections):
+    # Snapshot of a request's connection set (from begin_request), safe against leases in worker threads
+    with _request_connections_lock:
+        return list(connections)
+
+def get_pg_connection(pool=None):
+    pool = pool or connection_pool
+    try:
+        if pool:
             print("Fetching a connection from the pool...")  # Log message
-            conn = connection_pool.getconn()
+            conn = pool.getconn()
             if conn:
                 print("Successfully fetched a connection from the pool.")  # Log success
                 return conn
         else:
             print("Connection pool is not initialized.")  # Log error
             return None
-    except OperationalError as e:
+    except (OperationalError, PoolError) as e:
         print(f"Failed to fetch a connection from the pool: {e}")  # Log the error
         return None
 
-def release_pg_connection(conn):
+def release_pg_connection(conn, pool=None):
+    pool = pool or connection_pool
     try:
-        if connection_pool and conn:
+        if pool and conn:
             print("Releasing the connection back to the pool...")  # Log message
-            connection_pool.putconn(conn)
+            pool.putconn(conn)
             print("Connection released successfully.")  # Log success
     except Exception as e:
         print(f"Failed to release the connection: {e}")  # Log the error
 
+@contextmanager
+def pg_connection(readonly=None):
+    """
+    Lease a pooled connection for the duration of a `with` block.
+    Reads go to a replica when the route policy (or `readonly`) allows it, falling back to the primary.
+    The session gets the statement_timeout of the route class and the connection is registered with the request
+    so its query can be cancelled if the client disconnects.
+    Yields None when no connection could be obtained. The connection always goes back to the pool on exit;
+    the pool discards it instead if it was closed or broken while leased.
+    """
+    lease_start = time.perf_counter()
+    pool = select_pool(readonly)
+    conn = get_pg_connection(pool)
+    if conn is None and pool is not connection_pool:
+        pool = connection_pool
+        conn = get_pg_connection(pool)
+    if conn is not None:
+        track_request_connection(conn, (time.perf_counter() - lease_start) * 1000)
+        apply_statement_timeout(conn)
+    try:
+        yield conn
+    finally:
+        untrack_request_connection(conn)
+        release_pg_connection(conn, pool)
+
+def stream_rows(conn, query, params=None, fetch_size=None, cursor_factory=RealDictCursor):
+    """
+    Run a query on a named (server-side) cursor and yield the rows as dictionaries (or records with
+    cursor_factory=RecordCursor), fetching `fetch_size` rows per round trip instead of materializing the whole result.
+    """
+    cursor = conn.cursor(name=f"stream_rows_{next(_stream_cursor_ids)}", cursor_factory=cursor_factory)
+    cursor.itersize = fetch_size or PG_STREAM_FETCH_SIZE
+    try:
+        cursor.execute(query, params)
+        for row in cursor:
+            yield row
+    finally:
+        cursor.close()
+
+def get_pool_stats():
+    stats = connection_pool.stats() if connection_pool else {}
+    if replica_pools:
+        stats["replicas"] = [pool.stats() for pool in replica_pools]
+    return stats
+
 def close_connection_pool():
     try:
         if connection_pool:
             print("Closing all connections in the pool...")  # Log message
             connection_pool.closeall()
+            for pool in replica_pools:
+                pool.closeall()
             print("Connection pool closed successfully.")  # Log success
     except Exception as e:
         print(f"Failed to close the connection pool: {e}")  # Log the error
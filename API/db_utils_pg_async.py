@@ -0,0 +1,273 @@
+import asyncio
+import time
+import weakref
+from contextlib import asynccontextmanager
+import psycopg
+from psycopg import OperationalError, sql
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from itertools import count
+from utils import record_class
+from db_utils_pg import (PG_CONNECTION_PARAMS, PG_POOL_SETTINGS, PG_REPLICA_DSNS, PG_STREAM_FETCH_SIZE, use_replica,
+                         current_statement_timeout, track_request_connection, untrack_request_connection,
+                         record_query, should_explain)
+
+class InstrumentedAsyncCursorMixin:
+    """
+    Async counterpart of db_utils_pg.InstrumentedCursorMixin: times every execute() and feeds record_query.
+    """
+
+    async def execute(self, query, params=None, **kwargs):
+        text = query.as_string(self.connection) if isinstance(query, sql.Composable) else query
+        start = time.perf_counter()
+        try:
+            result = await super().execute(query, params, **kwargs)
+        except BaseException:
+            record_query(self.connection, text, (time.perf_counter() - start) * 1000, self.rowcount)
+            raise
+        duration_ms = (time.perf_counter() - start) * 1000
+        plan = await self._explain(text, params) if should_explain(str(text), duration_ms) else None
+        record_query(self.connection, text, duration_ms, self.rowcount, plan)
+        return result
+
+    async def _explain(self, query, params):
+        # Re-run the read under a savepoint on an uninstrumented cursor so a failure cannot abort the route's transaction
+        explain_cursor = psycopg.AsyncCursor(self.connection)
+        try:
+            await explain_cursor.execute("SAVEPOINT explain_capture")
+            await explain_cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + str(query), params)
+            plan = "\n".join(row[0] for row in await explain_cursor.fetchall())
+            await explain_cursor.execute("RELEASE SAVEPOINT explain_capture")
+            return plan
+        except psycopg.Error as e:
+            await explain_cursor.execute("ROLLBACK TO SAVEPOINT explain_capture")
+            return f"EXPLAIN failed: {e}"
+        finally:
+            await explain_cursor.close()
+
+class InstrumentedAsyncCursor(InstrumentedAsyncCursorMixin, psycopg.AsyncCursor):
+    pass
+
+class InstrumentedAsyncServerCursor(InstrumentedAsyncCursorMixin, psycopg.AsyncServerCursor):
+    pass
+
+class InstrumentedAsyncConnection(psycopg.AsyncConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = InstrumentedAsyncCursor
+        self.server_cursor_factory = InstrumentedAsyncServerCursor
+
+def _make_async_pool(conninfo):
+    return AsyncConnectionPool(
+        conninfo,
+        connection_class=InstrumentedAsyncConnection,  # Feeds the query log in db_utils_pg
+        min_size=PG_POOL_SETTINGS["min_size"],  # Minimum number of connections
+        max_size=PG_POOL_SETTINGS["max_size"],  # Maximum number of connections
+        timeout=PG_POOL_SETTINGS["acquire_timeout"],  # Bounded wait for a free connection
+        max_lifetime=PG_POOL_SETTINGS["max_lifetime"],  # Recycle long-lived connections
+        max_idle=PG_POOL_SETTINGS["max_idle"],  # Close idle connections above min_size
+        check=AsyncConnectionPool.check_connection,  # Pre-ping connections before handing them out
+        open=False  # Opened on startup (or lazily) inside the running event loop
+    )
+
+# asyncio-native pool used by the `async def` routes so that database waits
+# yield to the event loop instead of blocking it (psycopg2 is blocking only).
+async_connection_pool = _make_async_pool(make_conninfo(**PG_CONNECTION_PARAMS))
+# Read replica pools, used round-robin for reads (see db_utils_pg.route_uses_replica)
+async_replica_pools = [_make_async_pool(dsn) for dsn in PG_REPLICA_DSNS]
+_replica_turn = count()
+_pool_open_lock = None
+
+# Named queries run as server-side prepared statements (psycopg prepares them once per connection: prepare=True).
+# The per-connection record of the names only feeds the prepared statement counters of /debug/slow_queries.
+PREPARED_STATEMENTS = {}
+_prepared_on_connection = weakref.WeakKeyDictionary()  # connection -> set of statement names it has prepared
+prepared_statement_stats = {"prepares": 0, "hits": 0}
+_stream_cursor_ids = count(1)
+_session_timeouts = weakref.WeakKeyDictionary()  # connection -> statement_timeout currently set on its session
+
+async def open_async_connection_pool():
+    global _pool_open_lock
+    if not async_connection_pool.closed:
+        return
+    if _pool_open_lock is None:
+        _pool_open_lock = asyncio.Lock()
+    async with _pool_open_lock:
+        if async_connection_pool.closed:
+            print("Initializing async PostgreSQL connection pool...")  # Log message
+            await async_connection_pool.open()
+            for pool in async_replica_pools:
+                await pool.open(wait=False)
+            print("Async PostgreSQL connection pool initialized successfully.")  # Log success
+
+def record_row(cursor):
+    """
+    Row factory returning utils.Record rows: tuples indexable by column name, without building a mapping per row.
+    """
+    if cursor.description is None:
+        return tuple
+    return record_class([column.name for column in cursor.description])
+
+def select_async_pool(readonly=None):
+    # Round-robin across the replicas for reads
+    if async_replica_pools and use_replica(readonly):
+        return async_replica_pools[next(_replica_turn) % len(async_replica_pools)]
+    return async_connection_pool
+
+async def apply_statement_timeout(conn):
+    # Sessions keep their statement_timeout across leases, so only change it when the route class differs
+    timeout = current_statement_timeout()
+    if _session_timeouts.get(conn) == timeout:
+        return
+    try:
+        await conn.execute("SELECT set_config('statement_timeout', %s, false)", (str(timeout),))
+        await conn.commit()
+        _session_timeouts[conn] = timeout
+    except psycopg.Error as e:
+        print(f"Failed to set statement_timeout: {e}")  # Log the error
+
+async def get_pg_async_connection(pool=None):
+    pool = pool or async_connection_pool
+    try:
+        await open_async_connection_pool()
+        return await pool.getconn()
+    except (OperationalError, PoolTimeout) as e:
+        print(f"Failed to fetch a connection from the async pool: {e}")  # Log the error
+        return None
+
+async def release_pg_async_connection(conn, pool=None):
+    pool = pool or async_connection_pool
+    try:
+        if conn:
+            # End any read transaction left open by the route before handing the connection back
+            if conn.info.transaction_status == psycopg.pq.TransactionStatus.INTRANS:
+                await conn.rollback()
+                # psycopg discards the connection's prepared statements on rollback
+                _prepared_on_connection.pop(conn, None)
+            await pool.putconn(conn)
+    except Exception as e:
+        print(f"Failed to release the async connection: {e}")  # Log the error
+
+@asynccontextmanager
+async def pg_async_connection(readonly=None):
+    """
+    Async counterpart of db_utils_pg.pg_connection: yields a pooled connection (or None) and always returns it.
+    Reads go to a replica when the route policy (or `readonly`) allows it, falling back to the primary,
+    with the statement_timeout of the route class.
+    psycopg_pool discards connections that come back broken.
+    """
+    lease_start = time.perf_counter()
+    pool = select_async_pool(readonly)
+    conn = await get_pg_async_connection(pool)
+    if conn is None and pool is not async_connection_pool:
+        pool = async_connection_pool
+        conn = await get_pg_async_connection(pool)
+    if conn is not None:
+        track_request_connection(conn, (time.perf_counter() - lease_start) * 1000)
+        await apply_statement_timeout(conn)
+    try:
+        yield conn
+    finally:
+        untrack_request_connection(conn)
+        await release_pg_async_connection(conn, pool)
+
+def get_async_pool_stats():
+    stats = async_connection_pool.get_stats()
+    if async_replica_pools:
+        stats["replicas"] = [pool.get_stats() for pool in async_replica_pools]
+    return stats
+
+def register_prepared_statement(name, query):
+    """
+    Register a parameterized query (using %s placeholders) under a statement name and return the name.
+    """
+    PREPARED_STATEMENTS[name] = query
+    return name
+
+async def execute_prepared(cursor, name, params):
+    """
+    Execute a registered statement as a server-side prepared statement, prepared on the cursor's connection the
+    first time it runs there. A rollback discards the connection's prepared statements, so routes end their reads
+    with a commit (see fetch_pipelined).
+    """
+    prepared = _prepared_on_connection.setdefault(cursor.connection, set())
+    if name in prepared:
+        prepared_statement_stats["hits"] += 1
+    else:
+        prepared.add(name)
+        prepared_statement_stats["prepares"] += 1
+    await cursor.execute(PREPARED_STATEMENTS[name], params, prepare=True)
+
+async def close_async_connection_pool():
+    try:
+        if not async_connection_pool.closed:
+            print("Closing all connections in the async pool...")  # Log message
+            await async_connection_pool.close()
+            for pool in async_replica_pools:
+                await pool.close()
+            print("Async connection pool closed successfully.")  # Log success
+    except Exception as e:
+        print(f"Failed to close the async connection pool: {e}")  # Log the error
+
+async def fetch_all(query, params=None):
+    """
+    Run a read query on a pooled async connection and return the rows as dictionaries.
+    """
+    async with pg_async_connection() as conn:
+        if conn is None:
+            raise OperationalError("Database connection failed")
+        cursor = conn.cursor(row_factory=dict_row)
+        await cursor.execute(query, params)
+        return await cursor.fetchall()
+
+async def fetch_one(query, params=None):
+    """
+    Run a read query on a pooled async connection and return the first row as a dictionary (or None).
+    """
+    async with pg_async_connection() as conn:
+        if conn is None:
+            raise OperationalError("Database connection failed")
+        cursor = conn.cursor(row_factory=dict_row)
+        await cursor.execute(query, params)
+        return await cursor.fetchone()
+
+async def fetch_pipelined(conn, statements, row_factory=dict_row):
+    """
+    Send several independent queries in one pipeline (a single network round trip) and return the rows of each,
+    in order. Each statement is (query, params), where query may be the name of a registered prepared statement.
+    Call it outside a transaction: inside one, conn.transaction() is only a savepoint and a later rollback of the
+    outer transaction would still discard the prepared statements.
+    """
+    if conn.info.transaction_status != psycopg.pq.TransactionStatus.IDLE:
+        raise psycopg.ProgrammingError("fetch_pipelined must run outside a transaction")
+    cursors = []
+    try:
+        # The reads end with a commit, which (unlike a rollback) keeps the connection's prepared statements
+        async with conn.transaction(), conn.pipeline():
+            for query, params in statements:
+                cursor = conn.cursor(row_factory=row_factory)
+                if query in PREPARED_STATEMENTS:
+                    await execute_prepared(cursor, query, params)
+                else:
+                    await cursor.execute(query, params)
+                cursors.append(cursor)
+    except psycopg.Error:
+        # The transaction rolled back, discarding the connection's prepared statements
+        _prepared_on_connection.pop(conn, None)
+        raise
+    return [await cursor.fetchall() for cursor in cursors]
+
+async def stream_rows(conn, query, params=None, fetch_size=None, row_factory=dict_row):
+    """
+    Run a query on a named (server-side) cursor and yield the rows as dictionaries (or records with
+    row_factory=record_row), fetching `fetch_size` rows per round trip instead of materializing the whole result.
+    """
+    cursor = conn.cursor(name=f"stream_rows_{next(_stream_cursor_ids)}", row_factory=row_factory)
+    cursor.itersize = fetch_size or PG_STREAM_FETCH_SIZE
+    try:
+        await cursor.execute(query, params)
+        async for row in cursor:
+            yield row
+    finally:
+        await cursor.close()
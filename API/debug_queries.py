@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse
+from db_utils_pg import QUERY_LOG_SETTINGS, slow_query_log, query_stats, get_pool_stats
+from db_utils_pg_async import get_async_pool_stats, prepared_statement_stats
+
+debug_router = APIRouter()
+
+######################################################################
+#      DEBUG / Query Instrumentation
+######################################################################
+
+@debug_router.get('/debug/slow_queries')
+def get_slow_queries(
+    limit: int = Query(100, description="Maximum number of slow queries to return (newest first)"),
+    min_ms: float = Query(None, description="Only return queries at least this slow (defaults to the log threshold)"),
+    top: int = Query(20, description="Number of query fingerprints to return, by total time")
+):
+    """
+    Slow query log plus per-fingerprint totals, pool and prepared statement counters.
+    """
+    min_ms = QUERY_LOG_SETTINGS["slow_query_ms"] if min_ms is None else min_ms
+    slow_queries = [entry for entry in reversed(slow_query_log) if entry["duration_ms"] >= min_ms][:limit]
+
+    fingerprints = sorted(
+        ({"fingerprint": fingerprint, **stats} for fingerprint, stats in list(query_stats.items())),
+        key=lambda stats: stats["total_ms"],
+        reverse=True
+    )[:top]
+    for stats in fingerprints:
+        stats["total_ms"] = round(stats["total_ms"], 3)
+        stats["max_ms"] = round(stats["max_ms"], 3)
+        stats["avg_ms"] = round(stats["total_ms"] / stats["calls"], 3)
+
+    return JSONResponse(content={
+        "settings": QUERY_LOG_SETTINGS,
+        "slow_queries": slow_queries,
+        "top_queries": fingerprints,
+        "pool": get_pool_stats(),
+        "async_pool": get_async_pool_stats(),
+        "prepared_statements": prepared_statement_stats
+    })
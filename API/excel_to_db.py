@@ -2,8 +2,9 @@ import pandas as pd
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
 from fastapi.responses import JSONResponse
 from io import BytesIO
-from db_utils_pg import get_pg_connection, release_pg_connection
+from db_utils_pg import pg_connection
 import psycopg2
+from resource_day_fact import all_resources_refresh_statements
 import json
 import os
 
@@ -101,7 +102,6 @@ def process_excel_data(df: pd.DataFrame, table_name: str):
     Returns:
         dict: A dictionary containing the status of the operation.
     """
-    conn = None
     try:
         # Get table configuration
         table_config = CONFIG[table_name]
@@ -129,38 +129,48 @@ def process_excel_data(df: pd.DataFrame, table_name: str):
         filtered_df = filtered_df.where(pd.notnull(filtered_df), None)
 
         # Establish a database connection
-        conn = get_pg_connection()
-        if conn is None:
-            raise HTTPException(status_code=500, detail="Database connection failed")
-
-        cursor = conn.cursor()
-
-        # Generate the SQL query for upsert
-        columns = ", ".join(db_columns)
-        placeholders = ", ".join(["%s"] * len(db_columns))
-        update_clause = ", ".join([f"{col} = EXCLUDED.{col}" for col in db_columns])
-        conflict_clause = ", ".join(conflict_columns)
-        query = f"""
-            INSERT INTO pmo.{table_name} ({columns})
-            VALUES ({placeholders})
-            ON CONFLICT ({conflict_clause}) DO UPDATE SET
-            {update_clause}
-        """
-
-        # Debugging: Print the SQL query
-        print("Generated SQL query:")
-        print(query)
-
-        # Upsert data into the database table
-        for _, row in filtered_df.iterrows():
-            # Convert row values to a tuple to avoid 'numpy.ndarray' issues
-            row_values = tuple(row.values)
-            cursor.execute(query, row_values)
-
-        # Commit the transaction
-        conn.commit()
-        cursor.close()
-        return {"message": f"Data imported successfully into {table_name}"}
+        with pg_connection() as conn:
+            if conn is None:
+                raise HTTPException(status_code=500, detail="Database connection failed")
+
+            cursor = conn.cursor()
+
+            # Generate the SQL query for upsert
+            columns = ", ".join(db_columns)
+            placeholders = ", ".join(["%s"] * len(db_columns))
+            update_clause = ", ".join([f"{col} = EXCLUDED.{col}" for col in db_columns])
+            conflict_clause = ", ".join(conflict_columns)
+            query = f"""
+                INSERT INTO pmo.{table_name} ({columns})
+                VALUES ({placeholders})
+                ON CONFLICT ({conflict_clause}) DO UPDATE SET
+                {update_clause}
+            """
+            if table_name == "resources":
+                # Report which rows are new: only new resources change the capacity facts (pmo.resource_day_fact)
+                query += " RETURNING resource_id, xmax = 0 AS inserted"
+            new_resource_ids = []
+
+            # Debugging: Print the SQL query
+            print("Generated SQL query:")
+            print(query)
+
+            # Upsert data into the database table
+            for _, row in filtered_df.iterrows():
+                # Convert row values to a tuple to avoid 'numpy.ndarray' issues
+                row_values = tuple(row.values)
+                cursor.execute(query, row_values)
+                if table_name == "resources":
+                    new_resource_ids += [resource_id for resource_id, inserted in cursor.fetchall() if inserted]
+
+            # Build the capacity facts of the new resources
+            for statement in all_resources_refresh_statements(new_resource_ids):
+                cursor.execute(*statement)
+
+            # Commit the transaction
+            conn.commit()
+            cursor.close()
+            return {"message": f"Data imported successfully into {table_name}"}
 
     except psycopg2.Error as e:
         print(f"Database error: {e}")
@@ -168,6 +178,3 @@ def process_excel_data(df: pd.DataFrame, table_name: str):
     except Exception as e:
         print(f"Unexpected error in process_excel_data: {e}")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
-    finally:
-        if conn:
-            release_pg_connection(conn)
@@ -1,9 +1,10 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from business_lines import business_lines_router
 from managers import managers_router
-from resources import resources_router
+from resources import resources_router, portfolio_capacity_snapshots
 from resource_timeoff import timeoff_router
 from resource_roles import roles_router
 from resource_allocation import allocation_router
@@ -11,8 +12,27 @@ from resource_allocation_actual import allocation_actual_router
 from projects import projects_router
 from excel_to_db import excel_to_db_router
 from screener import screener_router
+from debug_queries import debug_router
+from db_middleware import DatabaseRequestMiddleware
+from db_utils_pg_async import open_async_connection_pool, close_async_connection_pool
+from resource_day_fact import open_resource_day_facts
+from capacity_pool import close_capacity_pool
+from capacity_snapshot import open_capacity_snapshots, close_capacity_snapshots
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the async PostgreSQL pool inside the server's event loop and close it on shutdown
+    await open_async_connection_pool()
+    # Build (or check) the materialized capacity facts before serving requests
+    await open_resource_day_facts()
+    # Keep the portfolio rollup snapshots current in the background
+    await open_capacity_snapshots(portfolio_capacity_snapshots)
+    yield
+    await close_capacity_snapshots()
+    close_capacity_pool()
+    await close_async_connection_pool()
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -23,6 +43,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Apply the per-route database policy (replica reads, statement timeouts, cancellation on client disconnect)
+app.add_middleware(DatabaseRequestMiddleware)
+
 # Serve the configuration file as a static file
 app.mount("/static", StaticFiles(directory="D:\SourceCode\PMO\API"), name="static")
 
@@ -37,6 +60,7 @@ app.include_router(allocation_actual_router, prefix="", tags=["Resource Allocati
 app.include_router(projects_router, tags=["Projects"])
 app.include_router(excel_to_db_router, prefix="", tags=["Excel Import"])
 app.include_router(screener_router, prefix="", tags=["Screener / Query Builder"])
+app.include_router(debug_router, prefix="", tags=["Debug"])
 
 # Root endpoint
 @app.get("/")
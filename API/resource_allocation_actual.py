@@ -1,14 +1,17 @@
 import pandas as pd
 from fastapi import APIRouter, HTTPException, UploadFile, Form, Request
 from fastapi.responses import JSONResponse
-from db_utils_pg import get_pg_connection, release_pg_connection
-import psycopg2
-from psycopg2.extras import DictCursor
+from db_utils_pg_async import pg_async_connection, stream_rows, record_row
+import psycopg
+from psycopg.rows import dict_row
 from datetime import datetime, date, timedelta  # Import `date` and `timedelta` for interval calculations
 from decimal import Decimal  # Import `Decimal` for isinstance checks
 from io import BytesIO
 from fastapi import File
-from utils import convert_decimal_to_float  # Import the utility function
+from utils import convert_decimal_to_float, json_stream_response_async  # Import the utility functions
+from resource_day_fact import fact_refresh_statements
+from business_calendar import period_bounds
+import numpy as np
 
 allocation_actual_router = APIRouter()
 
@@ -71,7 +74,7 @@ async def import_timesheet(
         if not file_name.endswith('.xlsx'):
             raise HTTPException(status_code=400, detail="Invalid file format. Please upload an Excel file.")
 
-        result = get_import_timesheet_xls(
+        result = await get_import_timesheet_xls(
             df,
             file_name,
             project_name=project_name  # <-- Pass to function
@@ -80,7 +83,7 @@ async def import_timesheet(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error importing timesheet: {str(e)}")
 
-def get_import_timesheet_xls(
+async def get_import_timesheet_xls(
     df: pd.DataFrame,
     file_name: str,
     project_name: str = None
@@ -96,7 +99,6 @@ def get_import_timesheet_xls(
         dict: A dictionary containing the status of the operation.
     """
 
-    conn = None
     try:
         # Rename columns to match the database table
         df.rename(columns={
@@ -165,120 +167,121 @@ def get_import_timesheet_xls(
 
 
         # Establish a database connection
-        conn = get_pg_connection()
-        if conn is None:
-            raise HTTPException(status_code=500, detail="Database connection failed")
+        async with pg_async_connection() as conn:
+            if conn is None:
+                raise HTTPException(status_code=500, detail="Database connection failed")
+
+            cursor = conn.cursor()
+
+            # Prepare lookups for project_id and resource_id
+            # Fetch all project_name -> project_id
+            await cursor.execute("SELECT timesheet_project_name, project_id FROM pmo.projects")
+            project_map = {row[0]: row[1] for row in await cursor.fetchall()}
+            # Fetch all timesheet_resource_name -> resource_id
+            await cursor.execute("SELECT timesheet_resource_name, resource_id FROM pmo.resources")
+            resource_map = {row[0]: row[1] for row in await cursor.fetchall()}
+
+            # --- Convert all date fields to string for DB insert ---
+            date_fields = ['ts_entry_date', 'ts_project_start_date', 'ts_project_end_date']
+            for col in date_fields:
+                if col in df.columns:
+                    df[col] = df[col].apply(
+                        lambda x: x.strftime('%Y-%m-%d') if pd.notnull(x) and isinstance(x, (datetime, date)) else (str(x) if pd.notnull(x) else None)
+                    )
+
+            # Upsert data into the pmo.timesheet_entry table
+            inserted_rows = 0
+            accepted_rows = []
+            for _, row in df.iterrows():
+                project_id = project_map.get(row['ts_project_name'])
+                resource_id = resource_map.get(row['ts_user_name'])
+                if project_id is None or resource_id is None:
+                    # Print skipped rows for debug
+                    #print(f"Skipping row: project_id={project_id}, resource_id={resource_id}, project_name={row['ts_project_name']}, user_name={row['ts_user_name']}")
+                    continue
+                # Print accepted row for debug, including entry_date from Excel (as original datetime)
+                accepted_rows.append({
+                    "ts_project_name": row['ts_project_name'],
+                    "ts_user_name": row['ts_user_name'],
+                    "ts_entry_date": row['ts_entry_date'],
+                    "ts_project_start_date": row.get('ts_project_start_date'),
+                    "ts_project_end_date": row.get('ts_project_end_date'),
+                    "project_id": project_id,
+                    "resource_id": resource_id
+                })
+                await cursor.execute("""
+                    INSERT INTO pmo.timesheet_entry (
+                        ts_capitalization_project,
+                        ts_investment_project,
+                        ts_project_start_date,
+                        ts_project_end_date,
+                        ts_project_description,
+                        ts_project_name,
+                        ts_project_task,
+                        ts_user_name,
+                        ts_entry_date,
+                        ts_total_hrs,
+                        ts_department,
+                        ts_department_code,
+                        ts_project_code,
+                        ts_input_file_name,
+                        project_id,
+                        resource_id
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (ts_project_name, ts_user_name, ts_entry_date) DO UPDATE SET
+                        ts_capitalization_project = EXCLUDED.ts_capitalization_project,
+                        ts_investment_project = EXCLUDED.ts_investment_project,
+                        ts_project_start_date = EXCLUDED.ts_project_start_date,
+                        ts_project_end_date = EXCLUDED.ts_project_end_date,
+                        ts_project_description = EXCLUDED.ts_project_description,
+                        ts_total_hrs = EXCLUDED.ts_total_hrs,
+                        ts_department = EXCLUDED.ts_department,
+                        ts_department_code = EXCLUDED.ts_department_code,
+                        ts_project_code = EXCLUDED.ts_project_code,
+                        ts_input_file_name = EXCLUDED.ts_input_file_name,
+                        project_id = EXCLUDED.project_id,
+                        resource_id = EXCLUDED.resource_id
+                """, (
+                    row.get('ts_capitalization_project'),
+                    row.get('ts_investment_project'),
+                    row.get('ts_project_start_date'),
+                    row.get('ts_project_end_date'),
+                    row.get('ts_project_description'),
+                    row.get('ts_project_name'),
+                    row.get('ts_project_task'),
+                    row.get('ts_user_name'),
+                    row.get('ts_entry_date'),
+                    row.get('ts_total_hrs'),
+                    row.get('ts_department'),
+                    row.get('ts_department_code'),
+                    row.get('ts_project_code'),
+                    row.get('ts_input_file_name'),
+                    project_id,
+                    resource_id
+                ))
+                inserted_rows += 1
 
-        cursor = conn.cursor()
+            #print("Rows accepted for upsert (with all date fields as string):")
+            #for r in accepted_rows:
+            #    print(r)
 
-        # Prepare lookups for project_id and resource_id
-        # Fetch all project_name -> project_id
-        cursor.execute("SELECT timesheet_project_name, project_id FROM pmo.projects")
-        project_map = {row[0]: row[1] for row in cursor.fetchall()}
-        # Fetch all timesheet_resource_name -> resource_id
-        cursor.execute("SELECT timesheet_resource_name, resource_id FROM pmo.resources")
-        resource_map = {row[0]: row[1] for row in cursor.fetchall()}
+            # Print the first few values of ts_entry_date for debug
+            #print("First 10 ts_entry_date values after parsing:", df['ts_entry_date'].head(10).tolist())
 
-        # --- Convert all date fields to string for DB insert ---
-        date_fields = ['ts_entry_date', 'ts_project_start_date', 'ts_project_end_date']
-        for col in date_fields:
-            if col in df.columns:
-                df[col] = df[col].apply(
-                    lambda x: x.strftime('%Y-%m-%d') if pd.notnull(x) and isinstance(x, (datetime, date)) else (str(x) if pd.notnull(x) else None)
-                )
+            #print(f"Rows inserted/updated: {inserted_rows}")
 
-        # Upsert data into the pmo.timesheet_entry table
-        inserted_rows = 0
-        accepted_rows = []
-        for _, row in df.iterrows():
-            project_id = project_map.get(row['ts_project_name'])
-            resource_id = resource_map.get(row['ts_user_name'])
-            if project_id is None or resource_id is None:
-                # Print skipped rows for debug
-                #print(f"Skipping row: project_id={project_id}, resource_id={resource_id}, project_name={row['ts_project_name']}, user_name={row['ts_user_name']}")
-                continue
-            # Print accepted row for debug, including entry_date from Excel (as original datetime)
-            accepted_rows.append({
-                "ts_project_name": row['ts_project_name'],
-                "ts_user_name": row['ts_user_name'],
-                "ts_entry_date": row['ts_entry_date'],
-                "ts_project_start_date": row.get('ts_project_start_date'),
-                "ts_project_end_date": row.get('ts_project_end_date'),
-                "project_id": project_id,
-                "resource_id": resource_id
-            })
-            cursor.execute("""
-                INSERT INTO pmo.timesheet_entry (
-                    ts_capitalization_project,
-                    ts_investment_project,
-                    ts_project_start_date,
-                    ts_project_end_date,
-                    ts_project_description,
-                    ts_project_name,
-                    ts_project_task,
-                    ts_user_name,
-                    ts_entry_date,
-                    ts_total_hrs,
-                    ts_department,
-                    ts_department_code,
-                    ts_project_code,
-                    ts_input_file_name,
-                    project_id,
-                    resource_id
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (ts_project_name, ts_user_name, ts_entry_date) DO UPDATE SET
-                    ts_capitalization_project = EXCLUDED.ts_capitalization_project,
-                    ts_investment_project = EXCLUDED.ts_investment_project,
-                    ts_project_start_date = EXCLUDED.ts_project_start_date,
-                    ts_project_end_date = EXCLUDED.ts_project_end_date,
-                    ts_project_description = EXCLUDED.ts_project_description,
-                    ts_total_hrs = EXCLUDED.ts_total_hrs,
-                    ts_department = EXCLUDED.ts_department,
-                    ts_department_code = EXCLUDED.ts_department_code,
-                    ts_project_code = EXCLUDED.ts_project_code,
-                    ts_input_file_name = EXCLUDED.ts_input_file_name,
-                    project_id = EXCLUDED.project_id,
-                    resource_id = EXCLUDED.resource_id
-            """, (
-                row.get('ts_capitalization_project'),
-                row.get('ts_investment_project'),
-                row.get('ts_project_start_date'),
-                row.get('ts_project_end_date'),
-                row.get('ts_project_description'),
-                row.get('ts_project_name'),
-                row.get('ts_project_task'),
-                row.get('ts_user_name'),
-                row.get('ts_entry_date'),
-                row.get('ts_total_hrs'),
-                row.get('ts_department'),
-                row.get('ts_department_code'),
-                row.get('ts_project_code'),
-                row.get('ts_input_file_name'),
-                project_id,
-                resource_id
-            ))
-            inserted_rows += 1
-
-        #print("Rows accepted for upsert (with all date fields as string):")
-        #for r in accepted_rows:
-        #    print(r)
-
-        # Print the first few values of ts_entry_date for debug
-        #print("First 10 ts_entry_date values after parsing:", df['ts_entry_date'].head(10).tolist())
-
-        #print(f"Rows inserted/updated: {inserted_rows}")
-
-        conn.commit()
-        cursor.close()
-        return {"message": "Timesheet data imported successfully"}
-
-    except psycopg2.Error as e:
+            # Refresh the capacity facts over each imported resource's entry dates
+            for statement in fact_refresh_statements((r['resource_id'], r['ts_entry_date'], r['ts_entry_date']) for r in accepted_rows):
+                await cursor.execute(*statement)
+
+            await conn.commit()
+            await cursor.close()
+            return {"message": "Timesheet data imported successfully"}
+
+    except psycopg.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
-    finally:
-        if conn:
-            release_pg_connection(conn)
 
 @allocation_actual_router.get('/allocations_actual')
 async def get_allocations_actual(
@@ -311,13 +314,6 @@ async def get_allocations_actual(
         ts_start_date = ts_start_date or f"{current_year}-01-01"
         ts_end_date = ts_end_date or f"{current_year}-12-31"
 
-        # Establish a database connection
-        conn = get_pg_connection()
-        if conn is None:
-            raise HTTPException(status_code=500, detail="Database connection failed")
-
-        cursor = conn.cursor(cursor_factory=DictCursor)
-
         # Build the WHERE clause dynamically based on query parameters
         filters = []
         params = []
@@ -372,25 +368,21 @@ async def get_allocations_actual(
             ORDER BY a.ts_project_name, a.ts_entry_date
         """
 
-        cursor.execute(query, params)
-        data = cursor.fetchall()
+        # Stream the rows and convert date and Decimal objects to JSON-serializable types as they arrive,
+        # leasing the connection until the last row is sent
+        async def rows():
+            async with pg_async_connection() as conn:
+                if conn is None:
+                    raise HTTPException(status_code=500, detail="Database connection failed")
+                async for row in stream_rows(conn, query, params, row_factory=record_row):
+                    yield convert_decimal_to_float(row)
 
-        # Convert rows to a list of dictionaries
-        data = [dict(row) for row in data]
+        return await json_stream_response_async(rows())
 
-        # Convert date and Decimal objects to JSON-serializable types
-        data = convert_decimal_to_float(data)
-
-        cursor.close()
-        return JSONResponse(content=data, status_code=200)
-
-    except psycopg2.Error as e:
+    except psycopg.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
-    finally:
-        if conn:
-            release_pg_connection(conn)
 
 @allocation_actual_router.get('/allocation_actual_by_interval')
 async def allocation_actual_by_interval(
@@ -411,82 +403,66 @@ async def allocation_actual_by_interval(
     Returns:
         JSONResponse: A response containing the grouped actual allocation data.
     """
-    conn = get_pg_connection()
-    if conn is None:
-        return JSONResponse({"error": "Database connection failed"}, status_code=500)
+    async with pg_async_connection() as conn:
+        if conn is None:
+            return JSONResponse({"error": "Database connection failed"}, status_code=500)
 
-    try:
-        cursor = conn.cursor(cursor_factory=DictCursor)
+        try:
+            cursor = conn.cursor(row_factory=dict_row)
+
+            # Fetch actual allocation data using the SQL from /allocations_actual
+            await cursor.execute("""
+                SELECT
+                    p.project_id,
+                    p.project_name,
+                    DATE(te.entry_date) AS entry_date,
+                    SUM(te.total_hrs) AS actual_allocation,
+                    SUM(te.total_hrs) * r.blended_rate AS actual_allocation_cost
+                FROM pmo.timesheet_entry te
+                JOIN pmo.projects p ON te.project_name = p.timesheet_project_name
+                JOIN pmo.resources r ON te.user_name = r.timesheet_resource_name
+                WHERE te.entry_date BETWEEN %s AND %s
+                AND r.resource_id = %s
+                GROUP BY p.project_id, p.project_name, DATE(te.entry_date), r.blended_rate
+            """, (start_date, end_date, resource_id))
+            actual_data = await cursor.fetchall()
+
+            # Convert actual data to a list of dictionaries
+            actual_data = [dict(row) for row in actual_data]
+
+            # Initialize response structure
+            response = []
+            cumulative = {
+                "actual_hours": 0.0,
+                "actual_cost": 0.0
+            }
 
-        # Fetch actual allocation data using the SQL from /allocations_actual
-        cursor.execute("""
-            SELECT
-                p.project_id,
-                p.project_name,
-                DATE(te.entry_date) AS entry_date,
-                SUM(te.total_hrs) AS actual_allocation,
-                SUM(te.total_hrs) * r.blended_rate AS actual_allocation_cost
-            FROM pmo.timesheet_entry te
-            JOIN pmo.projects p ON te.project_name = p.timesheet_project_name
-            JOIN pmo.resources r ON te.user_name = r.timesheet_resource_name
-            WHERE te.entry_date BETWEEN %s AND %s
-            AND r.resource_id = %s
-            GROUP BY p.project_id, p.project_name, DATE(te.entry_date), r.blended_rate
-        """, (start_date, end_date, resource_id))
-        actual_data = cursor.fetchall()
-
-        # Convert actual data to a list of dictionaries
-        actual_data = [dict(row) for row in actual_data]
-
-        # Initialize response structure
-        response = []
-        cumulative = {
-            "actual_hours": 0.0,
-            "actual_cost": 0.0
-        }
-
-        # Generate weekly intervals with adjusted logic
-        start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
-        end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
-
-        intervals = []
-        current_start = start_date_obj
-        while current_start <= end_date_obj:
-            if current_start.weekday() == 0:  # Monday
-                week_start = current_start
-            else:
-                week_start = current_start  # Start from the given weekday
-
-            if current_start + timedelta(days=(4 - current_start.weekday())) <= end_date_obj:
-                week_end = current_start + timedelta(days=(4 - current_start.weekday()))  # Friday of the same week
-            else:
-                week_end = end_date_obj  # End at the given end_date if it's not Friday
-
-            intervals.append((week_start, week_end))
-            current_start = week_end + timedelta(days=1)
-
-        # Process data by interval
-        for week_start, week_end in intervals:
-            interval_key = f"{week_start.strftime('%Y-%m-%d')} to {week_end.strftime('%Y-%m-%d')}"
-            interval_data = {
-                "start_date": week_start.strftime('%Y-%m-%d'),
-                "end_date": week_end.strftime('%Y-%m-%d'),
+            # Intervals: Monday-Friday work weeks or calendar months, clamped to the requested dates
+            starts, ends = period_bounds(start_date, end_date, 'Monthly' if interval == 'Monthly' else 'Weekly')
+            if interval != 'Monthly':
+                weekdays = (starts.astype(int) - 4) % 7  # Monday = 0 (1970-01-01 was a Thursday)
+                ends = np.minimum(ends, starts + (4 - weekdays))
+                workweek = starts <= ends
+                starts, ends = starts[workweek], ends[workweek]
+            intervals = [{
+                "start_date": str(week_start),
+                "end_date": str(week_end),
                 "actual_allocation_hours": 0.0,
                 "cumulative_actual_hours": 0.0,
                 "actual_allocation_cost": 0.0,
                 "cumulative_actual_cost": 0.0,
                 "project_details": {}
-            }
-
-            # Aggregate actual allocation data
-            for record in actual_data:
-                entry_date = record["entry_date"]
-                if isinstance(entry_date, datetime):
-                    entry_date = entry_date.date()
-                elif isinstance(entry_date, str):
-                    entry_date = datetime.strptime(entry_date, '%Y-%m-%d').date()
-
-                if week_start.date() <= entry_date <= week_end.date():
+            } for week_start, week_end in zip(starts, ends)]
+
+            # Aggregate actual allocation data: one pass over the records, each into the interval its date falls in
+            if actual_data and intervals:
+                entry_days = np.array([str(record["entry_date"])[:10] for record in actual_data], dtype='datetime64[D]')
+                buckets = np.searchsorted(starts, entry_days, side='right') - 1
+                inside = (buckets >= 0) & (entry_days <= ends[buckets.clip(0)])
+                for record, bucket, counted in zip(actual_data, buckets.tolist(), inside.tolist()):
+                    if not counted:
+                        continue
+                    interval_data = intervals[bucket]
                     interval_data["actual_allocation_hours"] += float(record.get("actual_allocation", 0))
                     interval_data["actual_allocation_cost"] += float(record.get("actual_allocation_cost", 0))
 
@@ -499,28 +475,26 @@ async def allocation_actual_by_interval(
                         }
                     interval_data["project_details"][project_id]["project_actual_allocation_hours"] += float(record.get("actual_allocation", 0))
 
-            # Update cumulative values
-            cumulative["actual_hours"] += interval_data["actual_allocation_hours"]
-            cumulative["actual_cost"] += interval_data["actual_allocation_cost"]
+            for interval_data in intervals:
+                # Update cumulative values
+                cumulative["actual_hours"] += interval_data["actual_allocation_hours"]
+                cumulative["actual_cost"] += interval_data["actual_allocation_cost"]
 
-            interval_data["cumulative_actual_hours"] = cumulative["actual_hours"]
-            interval_data["cumulative_actual_cost"] = cumulative["actual_cost"]
+                interval_data["cumulative_actual_hours"] = cumulative["actual_hours"]
+                interval_data["cumulative_actual_cost"] = cumulative["actual_cost"]
 
-            response.append(interval_data)
+                response.append(interval_data)
 
-        return JSONResponse(content=response, status_code=200)
+            return JSONResponse(content=response, status_code=200)
 
-    except Exception as e:
-        return JSONResponse({"error": str(e)}, status_code=500)
-    finally:
-        if conn:
-            release_pg_connection(conn)
+        except Exception as e:
+            return JSONResponse({"error": str(e)}, status_code=500)
 
-    # --- Acceptable formats for ts_entry_start_date and ts_entry_end_date ---
-    # The safest formats are: 'YYYY-MM-DD' (e.g., '2025-03-01'), 'DD-MMM-YYYY' (e.g., '01-Mar-2025'), or 'MM/DD/YYYY'
-    # The code uses pd.to_datetime() which is flexible, but 'YYYY-MM-DD' is always safe.
+        # --- Acceptable formats for ts_entry_start_date and ts_entry_end_date ---
+        # The safest formats are: 'YYYY-MM-DD' (e.g., '2025-03-01'), 'DD-MMM-YYYY' (e.g., '01-Mar-2025'), or 'MM/DD/YYYY'
+        # The code uses pd.to_datetime() which is flexible, but 'YYYY-MM-DD' is always safe.
 
-    # Example: ts_entry_start_date='2025-03-01', ts_entry_end_date='2025-03-10'
+        # Example: ts_entry_start_date='2025-03-01', ts_entry_end_date='2025-03-10'
 
 @allocation_actual_router.post('/timesheet_entry_by_interval')
 async def insert_timesheet_entry_by_interval(
@@ -548,118 +522,115 @@ async def insert_timesheet_entry_by_interval(
             ts_entry_date_end = form.get("ts_entry_date_end")
 
     try:
-        conn = get_pg_connection()
-        if conn is None:
-            raise HTTPException(status_code=500, detail="Database connection failed")
-        cursor = conn.cursor()
-
-        # Build dynamic SQL and params
-        sql = """
-            SELECT ts_entry_date, ts_total_hrs, project_id, resource_id
-            FROM pmo.timesheet_entry
-            WHERE 1=1
-        """
-        params = []
-
-        if project_id is not None:
-            sql += " AND project_id = %s"
-            params.append(project_id)
-
-        if resource_id is not None:
-            sql += " AND resource_id = %s"
-            params.append(resource_id)
-
-        if ts_entry_date_start is not None and ts_entry_date_end is not None:
-            sql += " AND ts_entry_date BETWEEN %s AND %s"
-            params.extend([ts_entry_date_start, ts_entry_date_end])
-        elif ts_entry_date_start is not None:
-            sql += " AND ts_entry_date >= %s"
-            params.append(ts_entry_date_start)
-        elif ts_entry_date_end is not None:
-            sql += " AND ts_entry_date <= %s"
-            params.append(ts_entry_date_end)
-
-        sql += " ORDER BY ts_entry_date"
-
-        cursor.execute(sql, tuple(params))
-        rows = cursor.fetchall()
-
-        if not rows:
-            return JSONResponse({"message": "No timesheet data found for the given parameters."}, status_code=200)
-
-        # Build DataFrame
-        df = pd.DataFrame(rows, columns=['ts_entry_date', 'ts_total_hrs', 'project_id', 'resource_id'])
-        df['ts_entry_date'] = pd.to_datetime(df['ts_entry_date'])
-
-        # Weekly aggregation (Monday to Sunday)
-        df['start_date'] = df['ts_entry_date'].dt.to_period('W').apply(lambda r: r.start_time.date())
-        df['end_date'] = df['ts_entry_date'].dt.to_period('W').apply(lambda r: r.end_time.date())
-        weekly = df.groupby(['project_id', 'resource_id', 'start_date', 'end_date'], as_index=False)['ts_total_hrs'].sum()
-        weekly['interval_type'] = 'Weekly'
-        weekly['month_year'] = None
-
-        # Monthly aggregation
-        df['month_year'] = df['ts_entry_date'].dt.strftime('%Y-%m')
-        monthly = df.groupby(['project_id', 'resource_id', 'month_year'], as_index=False)['ts_total_hrs'].sum()
-        monthly['interval_type'] = 'Monthly'
-        monthly['start_date'] = None
-        monthly['end_date'] = None
-
-        # Prepare records for insert/update
-        weekly_records = [
-            (
-                row['project_id'],
-                row['resource_id'],
-                'Weekly',
-                str(row['start_date']),
-                str(row['end_date']),
-                None,
-                float(row['ts_total_hrs'])
-            )
-            for _, row in weekly.iterrows()
-        ]
-        monthly_records = [
-            (
-                row['project_id'],
-                row['resource_id'],
-                'Monthly',
-                None,
-                None,
-                row['month_year'],
-                float(row['ts_total_hrs'])
-            )
-            for _, row in monthly.iterrows()
-        ]
-
-        # Insert or update
-        for rec in weekly_records + monthly_records:
-            cursor.execute("""
-                INSERT INTO pmo.timesheet_entry_by_interval
-                (project_id, resource_id, interval_type, week_start, week_end, month_year, timesheet_hours)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT 
-                    (project_id, resource_id, interval_type, week_start, week_end)
-                    WHERE interval_type = 'Weekly'
-                DO UPDATE SET timesheet_hours = EXCLUDED.timesheet_hours;
-            """, rec) if rec[2] == 'Weekly' else cursor.execute("""
-                INSERT INTO pmo.timesheet_entry_by_interval
-                (project_id, resource_id, interval_type, week_start, week_end, month_year, timesheet_hours)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT 
-                    (project_id, resource_id, interval_type, month_year)
-                    WHERE interval_type = 'Monthly'
-                DO UPDATE SET timesheet_hours = EXCLUDED.timesheet_hours;
-            """, rec)
-
-        conn.commit()
-        cursor.close()
-
-        return JSONResponse({"message": "Timesheet entry by interval inserted/updated successfully."}, status_code=200)
+        async with pg_async_connection() as conn:
+            if conn is None:
+                raise HTTPException(status_code=500, detail="Database connection failed")
+            cursor = conn.cursor()
+
+            # Build dynamic SQL and params
+            sql = """
+                SELECT ts_entry_date, ts_total_hrs, project_id, resource_id
+                FROM pmo.timesheet_entry
+                WHERE 1=1
+            """
+            params = []
+
+            if project_id is not None:
+                sql += " AND project_id = %s"
+                params.append(project_id)
+
+            if resource_id is not None:
+                sql += " AND resource_id = %s"
+                params.append(resource_id)
+
+            if ts_entry_date_start is not None and ts_entry_date_end is not None:
+                sql += " AND ts_entry_date BETWEEN %s AND %s"
+                params.extend([ts_entry_date_start, ts_entry_date_end])
+            elif ts_entry_date_start is not None:
+                sql += " AND ts_entry_date >= %s"
+                params.append(ts_entry_date_start)
+            elif ts_entry_date_end is not None:
+                sql += " AND ts_entry_date <= %s"
+                params.append(ts_entry_date_end)
+
+            sql += " ORDER BY ts_entry_date"
+
+            await cursor.execute(sql, tuple(params))
+            rows = await cursor.fetchall()
+
+            if not rows:
+                return JSONResponse({"message": "No timesheet data found for the given parameters."}, status_code=200)
+
+            # Build DataFrame
+            df = pd.DataFrame(rows, columns=['ts_entry_date', 'ts_total_hrs', 'project_id', 'resource_id'])
+            df['ts_entry_date'] = pd.to_datetime(df['ts_entry_date'])
+
+            # Weekly aggregation (Monday to Sunday)
+            df['start_date'] = df['ts_entry_date'].dt.to_period('W').apply(lambda r: r.start_time.date())
+            df['end_date'] = df['ts_entry_date'].dt.to_period('W').apply(lambda r: r.end_time.date())
+            weekly = df.groupby(['project_id', 'resource_id', 'start_date', 'end_date'], as_index=False)['ts_total_hrs'].sum()
+            weekly['interval_type'] = 'Weekly'
+            weekly['month_year'] = None
+
+            # Monthly aggregation
+            df['month_year'] = df['ts_entry_date'].dt.strftime('%Y-%m')
+            monthly = df.groupby(['project_id', 'resource_id', 'month_year'], as_index=False)['ts_total_hrs'].sum()
+            monthly['interval_type'] = 'Monthly'
+            monthly['start_date'] = None
+            monthly['end_date'] = None
+
+            # Prepare records for insert/update
+            weekly_records = [
+                (
+                    row['project_id'],
+                    row['resource_id'],
+                    'Weekly',
+                    str(row['start_date']),
+                    str(row['end_date']),
+                    None,
+                    float(row['ts_total_hrs'])
+                )
+                for _, row in weekly.iterrows()
+            ]
+            monthly_records = [
+                (
+                    row['project_id'],
+                    row['resource_id'],
+                    'Monthly',
+                    None,
+                    None,
+                    row['month_year'],
+                    float(row['ts_total_hrs'])
+                )
+                for _, row in monthly.iterrows()
+            ]
+
+            # Insert or update
+            for rec in weekly_records + monthly_records:
+                await cursor.execute("""
+                    INSERT INTO pmo.timesheet_entry_by_interval
+                    (project_id, resource_id, interval_type, week_start, week_end, month_year, timesheet_hours)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT 
+                        (project_id, resource_id, interval_type, week_start, week_end)
+                        WHERE interval_type = 'Weekly'
+                    DO UPDATE SET timesheet_hours = EXCLUDED.timesheet_hours;
+                """, rec) if rec[2] == 'Weekly' else await cursor.execute("""
+                    INSERT INTO pmo.timesheet_entry_by_interval
+                    (project_id, resource_id, interval_type, week_start, week_end, month_year, timesheet_hours)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT 
+                        (project_id, resource_id, interval_type, month_year)
+                        WHERE interval_type = 'Monthly'
+                    DO UPDATE SET timesheet_hours = EXCLUDED.timesheet_hours;
+                """, rec)
+
+            await conn.commit()
+            await cursor.close()
+
+            return JSONResponse({"message": "Timesheet entry by interval inserted/updated successfully."}, status_code=200)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error in interval aggregation: {str(e)}")
-    finally:
-        if 'conn' in locals() and conn:
-            release_pg_connection(conn)
 
 @allocation_actual_router.get('/timesheet/{resource_id}')
 async def timesheet_by_resource_id(
@@ -680,67 +651,63 @@ async def timesheet_by_resource_id(
     Returns:
         JSONResponse: A response containing the timesheet records.
     """
-    conn = None
     try:
         # Establish database connection
-        conn = get_pg_connection()
-        if conn is None:
-            raise HTTPException(status_code=500, detail="Database connection failed")
+        async with pg_async_connection() as conn:
+            if conn is None:
+                raise HTTPException(status_code=500, detail="Database connection failed")
         
-        cursor = conn.cursor(cursor_factory=DictCursor)
+            cursor = conn.cursor(row_factory=dict_row)
         
-        # Build dynamic SQL query with filters
-        query = """
-            SELECT 
-                resource_id,
-                resource_name,
-                resource_email_id,
-                project_id,
-                project_name,
-                ts_start_date,
-                ts_end_date,
-                weekly_project_hrs,
-                ts_added_updated_date
-            FROM pmo.timesheet
-            WHERE resource_id = %s
-        """
-        params = [resource_id]
+            # Build dynamic SQL query with filters
+            query = """
+                SELECT 
+                    resource_id,
+                    resource_name,
+                    resource_email_id,
+                    project_id,
+                    project_name,
+                    ts_start_date,
+                    ts_end_date,
+                    weekly_project_hrs,
+                    ts_added_updated_date
+                FROM pmo.timesheet
+                WHERE resource_id = %s
+            """
+            params = [resource_id]
         
-        # Add optional filters
-        if project_id is not None:
-            query += " AND project_id = %s"
-            params.append(project_id)
+            # Add optional filters
+            if project_id is not None:
+                query += " AND project_id = %s"
+                params.append(project_id)
         
-        if ts_start_date is not None:
-            query += " AND ts_start_date >= %s"
-            params.append(ts_start_date)
+            if ts_start_date is not None:
+                query += " AND ts_start_date >= %s"
+                params.append(ts_start_date)
         
-        if ts_end_date is not None:
-            query += " AND ts_end_date <= %s"
-            params.append(ts_end_date)
+            if ts_end_date is not None:
+                query += " AND ts_end_date <= %s"
+                params.append(ts_end_date)
         
-        query += " ORDER BY ts_start_date DESC, project_name"
+            query += " ORDER BY ts_start_date DESC, project_name"
         
-        cursor.execute(query, params)
-        data = cursor.fetchall()
+            await cursor.execute(query, params)
+            data = await cursor.fetchall()
         
-        # Convert rows to list of dictionaries
-        data = [dict(row) for row in data]
+            # Convert rows to list of dictionaries
+            data = [dict(row) for row in data]
         
-        # Convert date and Decimal objects to JSON-serializable types
-        data = convert_decimal_to_float(data)
+            # Convert date and Decimal objects to JSON-serializable types
+            data = convert_decimal_to_float(data)
         
-        cursor.close()
+            await cursor.close()
         
-        return JSONResponse(content=data, status_code=200)
+            return JSONResponse(content=data, status_code=200)
         
-    except psycopg2.Error as e:
+    except psycopg.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
-    finally:
-        if conn:
-            release_pg_connection(conn)
 
 @allocation_actual_router.post('/timesheet/upsert')
 async def upsert_timesheet(
@@ -770,7 +737,6 @@ async def upsert_timesheet(
     Returns:
         JSONResponse: A response indicating success or failure.
     """
-    conn = None
     try:
         # Validate and parse dates
         try:
@@ -787,67 +753,60 @@ async def upsert_timesheet(
             raise HTTPException(status_code=400, detail="Weekly project hours cannot be negative.")
         
         # Establish database connection
-        conn = get_pg_connection()
-        if conn is None:
-            raise HTTPException(status_code=500, detail="Database connection failed")
+        async with pg_async_connection() as conn:
+            if conn is None:
+                raise HTTPException(status_code=500, detail="Database connection failed")
         
-        cursor = conn.cursor()
+            cursor = conn.cursor()
         
-        # Upsert query
-        upsert_query = """
-            INSERT INTO pmo.timesheet (
-                resource_id,
-                resource_name,
-                resource_email_id,
-                project_id,
-                project_name,
-                ts_start_date,
-                ts_end_date,
-                weekly_project_hrs,
-                ts_added_updated_date
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW())
-            ON CONFLICT (resource_id, project_id, ts_start_date, ts_end_date) 
-            DO UPDATE SET
-                resource_name = EXCLUDED.resource_name,
-                resource_email_id = EXCLUDED.resource_email_id,
-                project_name = EXCLUDED.project_name,
-                weekly_project_hrs = EXCLUDED.weekly_project_hrs,
-                ts_added_updated_date = NOW()
-        """
+            # Upsert query
+            upsert_query = """
+                INSERT INTO pmo.timesheet (
+                    resource_id,
+                    resource_name,
+                    resource_email_id,
+                    project_id,
+                    project_name,
+                    ts_start_date,
+                    ts_end_date,
+                    weekly_project_hrs,
+                    ts_added_updated_date
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW())
+                ON CONFLICT (resource_id, project_id, ts_start_date, ts_end_date) 
+                DO UPDATE SET
+                    resource_name = EXCLUDED.resource_name,
+                    resource_email_id = EXCLUDED.resource_email_id,
+                    project_name = EXCLUDED.project_name,
+                    weekly_project_hrs = EXCLUDED.weekly_project_hrs,
+                    ts_added_updated_date = NOW()
+            """
         
-        cursor.execute(
-            upsert_query,
-            (
-                resource_id,
-                resource_name,
-                resource_email_id,
-                project_id,
-                project_name,
-                start_date,
-                end_date,
-                weekly_project_hrs
+            await cursor.execute(
+                upsert_query,
+                (
+                    resource_id,
+                    resource_name,
+                    resource_email_id,
+                    project_id,
+                    project_name,
+                    start_date,
+                    end_date,
+                    weekly_project_hrs
+                )
             )
-        )
         
-        conn.commit()
-        cursor.close()
+            await conn.commit()
+            await cursor.close()
         
-        return JSONResponse(
-            content={"message": "Timesheet record upserted successfully."},
-            status_code=200
-        )
+            return JSONResponse(
+                content={"message": "Timesheet record upserted successfully."},
+                status_code=200
+            )
         
-    except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
+    except psycopg.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except HTTPException:
         # Re-raise HTTPException as-is
         raise
     except Exception as e:
-        if conn:
-            conn.rollback()
-        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
-    finally:
-        if conn:
-            release_pg_connection(conn)
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,262 @@
+import os
+import psycopg
+from datetime import date, timedelta
+from business_calendar import business_calendar, merge_ranges
+from db_utils_pg_async import pg_async_connection
+
+######################################################################
+#      Materialized daily capacity facts (pmo.resource_day_fact)
+######################################################################
+
+# Years kept before and after the current one; capacity reads outside the window are computed from the raw tables
+RESOURCE_DAY_FACT_YEARS = int(os.getenv("PMO_RESOURCE_DAY_FACT_YEARS", 1))
+
+# Materialized window (start, end) as this process last read it once the table is built, else None. Another worker
+# may move it (a new year): fact reads re-read it with RESOURCE_DAY_FACT_RANGE (see revalidate_fact_range).
+resource_day_fact_range = None
+
+RESOURCE_DAY_FACT_DDL = """
+    -- One row per (resource, business day, project). The project_id NULL row of a day always exists and carries the
+    -- resource's capacity and time off (plus hours booked without a project); project rows carry planned/actual hours.
+    CREATE TABLE IF NOT EXISTS pmo.resource_day_fact (
+        resource_id integer NOT NULL,
+        fact_date date NOT NULL,
+        project_id integer,
+        capacity_hours numeric NOT NULL DEFAULT 0,
+        planned_hours numeric NOT NULL DEFAULT 0,
+        actual_hours numeric NOT NULL DEFAULT 0,
+        is_planned boolean NOT NULL DEFAULT false,
+        is_actual boolean NOT NULL DEFAULT false,
+        is_timeoff boolean NOT NULL DEFAULT false
+    );
+    CREATE INDEX IF NOT EXISTS resource_day_fact_resource_date ON pmo.resource_day_fact (resource_id, fact_date);
+    CREATE TABLE IF NOT EXISTS pmo.resource_day_fact_range (
+        start_date date NOT NULL,
+        end_date date NOT NULL,
+        holidays date[] NOT NULL,
+        refreshed_at timestamp NOT NULL DEFAULT now()
+    );
+"""
+
+# Serialize the fact refreshes of each resource across transactions (resource ids sorted, so lockers cannot deadlock).
+# Under READ COMMITTED the refresh that runs after the lock sees what the previous holder committed, instead of two
+# concurrent refreshes both deleting the same rows and both inserting theirs.
+LOCK_RESOURCE_DAY_FACTS = """
+    SELECT pg_advisory_xact_lock(hashtext('pmo.resource_day_fact'), resource_id)
+    FROM unnest(%(resource_ids)s::int[]) AS resource_id
+"""
+
+# The materialized window, read back by the fact reads after their fact queries
+RESOURCE_DAY_FACT_RANGE = "SELECT start_date, end_date FROM pmo.resource_day_fact_range"
+
+# Recompute the facts of some (resource, start, end) windows: delete their rows and insert them again from
+# resources, time off, allocations and timesheet entries, in one statement. The windows are clipped to the window
+# and holidays recorded in pmo.resource_day_fact_range, not to this process's view of them. The delete works on the
+# statement's snapshot, so the windows must not overlap (see fact_refresh_statements) and concurrent refreshes of a
+# resource must hold its LOCK_RESOURCE_DAY_FACTS lock.
+REFRESH_RESOURCE_DAY_FACTS = """
+    WITH fact_range AS (
+        SELECT start_date, end_date, holidays FROM pmo.resource_day_fact_range
+    ),
+    windows AS (
+        SELECT w.resource_id, GREATEST(w.start_date, r.start_date) AS start_date, LEAST(w.end_date, r.end_date) AS end_date,
+               r.holidays
+        FROM unnest(%(resource_ids)s::int[], %(start_dates)s::date[], %(end_dates)s::date[]) AS w(resource_id, start_date, end_date)
+        CROSS JOIN fact_range r
+    ),
+    cleared AS (
+        DELETE FROM pmo.resource_day_fact f
+        USING windows w
+        WHERE f.resource_id = w.resource_id AND f.fact_date BETWEEN w.start_date AND w.end_date
+    ),
+    days AS (
+        SELECT w.resource_id, d::date AS fact_date, r.yearly_capacity::numeric / 261 AS daily_capacity  -- 261 weekdays in a year
+        FROM windows w
+        JOIN pmo.resources r ON r.resource_id = w.resource_id
+        CROSS JOIN generate_series(w.start_date, w.end_date, interval '1 day') AS d
+        WHERE extract(isodow FROM d) < 6 AND d::date <> ALL(w.holidays)
+    ),
+    resource_days AS (
+        SELECT d.resource_id, d.fact_date, d.daily_capacity,
+               EXISTS (
+                   SELECT 1 FROM pmo.timeoff t
+                   WHERE t.resource_id = d.resource_id
+                     AND d.fact_date BETWEEN DATE(t.timeoff_start_date) AND DATE(t.timeoff_end_date)
+               ) AS is_timeoff
+        FROM days d
+    ),
+    planned AS (
+        SELECT d.resource_id, d.fact_date, ra.project_id,
+               SUM(CASE WHEN COALESCE(ra.allocation_pct, 0) <> 0 THEN d.daily_capacity * ra.allocation_pct / 100
+                        ELSE COALESCE(ra.allocation_hrs_per_week, 0) / 5 END) AS planned_hours
+        FROM days d
+        JOIN pmo.resource_allocation ra ON ra.resource_id = d.resource_id
+         AND d.fact_date BETWEEN DATE(ra.allocation_start_date) AND DATE(ra.allocation_end_date)
+        GROUP BY d.resource_id, d.fact_date, ra.project_id
+    ),
+    actual AS (
+        SELECT d.resource_id, d.fact_date, te.project_id, SUM(COALESCE(te.ts_total_hrs, 0)) AS actual_hours
+        FROM days d
+        JOIN pmo.timesheet_entry te ON te.resource_id = d.resource_id AND te.ts_entry_date = d.fact_date
+        GROUP BY d.resource_id, d.fact_date, te.project_id
+    )
+    INSERT INTO pmo.resource_day_fact (resource_id, fact_date, project_id, capacity_hours, planned_hours, actual_hours, is_planned, is_actual, is_timeoff)
+    SELECT resource_id, fact_date, project_id, SUM(capacity_hours), SUM(planned_hours), SUM(actual_hours),
+           bool_or(is_planned), bool_or(is_actual), bool_or(is_timeoff)
+    FROM (
+        SELECT resource_id, fact_date, NULL::integer AS project_id, CASE WHEN is_timeoff THEN 0 ELSE daily_capacity END AS capacity_hours,
+               0 AS planned_hours, 0 AS actual_hours, false AS is_planned, false AS is_actual, is_timeoff
+        FROM resource_days
+        UNION ALL
+        SELECT resource_id, fact_date, project_id, 0, planned_hours, 0, true, false, false FROM planned
+        UNION ALL
+        SELECT resource_id, fact_date, project_id, 0, 0, actual_hours, false, true, false FROM actual
+    ) facts
+    GROUP BY resource_id, fact_date, project_id
+"""
+
+def fact_window():
+    """
+    Window to materialize: January 1st RESOURCE_DAY_FACT_YEARS years back to December 31st as many years ahead.
+    """
+    year = date.today().year
+    return date(year - RESOURCE_DAY_FACT_YEARS, 1, 1), date(year + RESOURCE_DAY_FACT_YEARS, 12, 31)
+
+def as_date(value):
+    return date.fromisoformat(str(value)[:10])
+
+def facts_cover(start_date, end_date):
+    """
+    Whether the capacity between start_date and end_date (YYYY-MM-DD strings or dates) can be read from the facts,
+    as far as this process knows; confirm it after the read with revalidate_fact_range.
+    """
+    if resource_day_fact_range is None:
+        return False
+    start, end = as_date(start_date), as_date(end_date)
+    return resource_day_fact_range[0] <= start and end <= resource_day_fact_range[1]
+
+def revalidate_fact_range(rows):
+    """
+    Adopt the window read with RESOURCE_DAY_FACT_RANGE (its rows) as this process's. Fact reads run that query
+    after their fact queries, so when another worker moved the window before the facts were read, the caller sees
+    facts_cover() turn False and reads the raw tables instead of serving missing days as zero capacity.
+    """
+    global resource_day_fact_range
+    if resource_day_fact_range is not None:
+        resource_day_fact_range = (rows[0]['start_date'], rows[0]['end_date']) if rows else None
+
+def changed_windows(resource_id, old_start, old_end, new_start, new_end):
+    """
+    Windows of the days covered by exactly one of two date ranges of a resource: what a write that only moves a
+    range's dates (same resource, project and hours) touches.
+    """
+    old_start, old_end, new_start, new_end = as_date(old_start), as_date(old_end), as_date(new_start), as_date(new_end)
+    if old_end < new_start or new_end < old_start:
+        return [(resource_id, old_start, old_end), (resource_id, new_start, new_end)]
+    windows = []
+    if old_start != new_start:
+        windows.append((resource_id, min(old_start, new_start), max(old_start, new_start) - timedelta(days=1)))
+    if old_end != new_end:
+        windows.append((resource_id, min(old_end, new_end) + timedelta(days=1), max(old_end, new_end)))
+    return windows
+
+def fact_refresh_params(windows):
+    """
+    REFRESH_RESOURCE_DAY_FACTS parameters for the (resource_id, start_date, end_date) ranges a write touched: each
+    resource's ranges are merged into disjoint windows (clipped to the recorded window by the query), so the refresh
+    costs the days touched rather than their overall span. None when there is nothing to refresh.
+    """
+    # Clip to the span of this process's window and today's, which another worker may have moved the table to
+    low, high = fact_window()
+    if resource_day_fact_range is not None:
+        low, high = min(resource_day_fact_range[0], low), max(resource_day_fact_range[1], high)
+    ranges = {}
+    for resource_id, start_date, end_date in windows:
+        if resource_id is None or start_date is None or end_date is None:
+            continue
+        start, end = sorted((as_date(start_date), as_date(end_date)))
+        start, end = max(start, low), min(end, high)
+        if start <= end:
+            ranges.setdefault(int(resource_id), []).append((start, end))
+    if not ranges:
+        return None
+    resource_ids, start_dates, end_dates = [], [], []
+    for resource_id, resource_ranges in sorted(ranges.items()):
+        starts, ends = merge_ranges(resource_ranges)
+        resource_ids += [resource_id] * len(starts)
+        start_dates += starts
+        end_dates += ends
+    return {"resource_ids": resource_ids, "start_dates": start_dates, "end_dates": end_dates}
+
+def fact_refresh_statements(windows):
+    """
+    (query, params) statements recomputing the facts touched by a write, to run in order with cursor.execute()
+    inside the writing transaction (psycopg2 and psycopg cursors both accept them): the per-resource refresh locks,
+    then the refresh of the windows (see fact_refresh_params). Empty when the facts are not in use or there is
+    nothing to refresh.
+    """
+    if resource_day_fact_range is None:
+        return []
+    params = fact_refresh_params(windows)
+    if params is None:
+        return []
+    return [(LOCK_RESOURCE_DAY_FACTS, {"resource_ids": sorted(set(params["resource_ids"]))}),
+            (REFRESH_RESOURCE_DAY_FACTS, params)]
+
+def all_resources_refresh_statements(resource_ids):
+    """
+    Statements recomputing the whole window for the given resources (bulk imports), or [].
+    """
+    if resource_day_fact_range is None:
+        return []
+    return fact_refresh_statements((resource_id, *fact_window()) for resource_id in resource_ids)
+
+async def open_resource_day_facts():
+    """
+    Create pmo.resource_day_fact if needed and bring it to this process's window and holiday calendar (a moved
+    window only builds the days that entered it), then enable the fact reads and write-time refreshes. Serialized across workers with an
+    advisory lock; on failure the facts stay disabled and capacity is computed from the raw tables.
+    """
+    global resource_day_fact_range
+    start_date, end_date = fact_window()
+    async with pg_async_connection(readonly=False) as conn:
+        if conn is None:
+            print("Resource day facts disabled: database connection failed")  # Log message
+            return
+        try:
+            async with conn.transaction():
+                cursor = conn.cursor()
+                await cursor.execute("SELECT pg_advisory_xact_lock(hashtext('pmo.resource_day_fact'))")
+                await cursor.execute(RESOURCE_DAY_FACT_DDL)
+                await cursor.execute("SELECT start_date, end_date, holidays FROM pmo.resource_day_fact_range")
+                current = await cursor.fetchone()
+                if current != (start_date, end_date, business_calendar.holidays):
+                    # Writers refresh their resources' facts while holding ROW EXCLUSIVE: wait for them, keep them out
+                    await cursor.execute("LOCK TABLE pmo.resource_day_fact IN SHARE ROW EXCLUSIVE MODE")
+                    await cursor.execute("SELECT resource_id FROM pmo.resources")
+                    resource_ids = [row[0] for row in await cursor.fetchall()]
+                    if current is None or current[2] != business_calendar.holidays or current[1] < start_date or end_date < current[0]:
+                        # New table, other holidays or no overlap: build the whole window
+                        print(f"Rebuilding resource day facts for {start_date} to {end_date}...")  # Log message
+                        await cursor.execute("TRUNCATE pmo.resource_day_fact")
+                        windows = [(start_date, end_date)]
+                    else:
+                        # The window moved (a new year): drop the days that left it, build only the days that entered it
+                        print(f"Moving resource day facts from {current[0]} - {current[1]} to {start_date} - {end_date}...")  # Log message
+                        await cursor.execute("DELETE FROM pmo.resource_day_fact WHERE fact_date < %s OR fact_date > %s", (start_date, end_date))
+                        windows = [(start, end) for start, end in ((start_date, current[0] - timedelta(days=1)),
+                                                                   (current[1] + timedelta(days=1), end_date)) if start <= end]
+                    # The refresh clips its windows to the recorded window, so record the new one first
+                    await cursor.execute("DELETE FROM pmo.resource_day_fact_range")
+                    await cursor.execute(
+                        "INSERT INTO pmo.resource_day_fact_range (start_date, end_date, holidays) VALUES (%s, %s, %s::date[])",
+                        (start_date, end_date, business_calendar.holidays))
+                    refresh = fact_refresh_params(
+                        (resource_id, window_start, window_end) for resource_id in resource_ids for window_start, window_end in windows)
+                    if refresh:
+                        await cursor.execute(REFRESH_RESOURCE_DAY_FACTS, refresh)
+            resource_day_fact_range = (start_date, end_date)
+            print(f"Resource day facts ready for {start_date} to {end_date}")  # Log success
+        except psycopg.Error as e:
+            resource_day_fact_range = None
+            print(f"Resource day facts disabled: {e}")  # Log the error
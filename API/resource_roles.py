@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException
-from db_utils_pg import get_pg_connection, release_pg_connection
+from db_utils_pg import pg_connection
 import psycopg2
 from psycopg2.extras import DictCursor
 
@@ -12,21 +12,18 @@ roles_router = APIRouter()
 # Retrieve all Resource Roles
 @roles_router.get('/resource_roles')
 def get_roles():
-    conn = get_pg_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Database connection failed")
-    try:
-        cursor = conn.cursor(cursor_factory=DictCursor)
-        cursor.execute("SELECT * FROM pmo.resource_roles")
-        roles = cursor.fetchall()
+    with pg_connection() as conn:
+        if conn is None:
+            raise HTTPException(status_code=500, detail="Database connection failed")
+        try:
+            cursor = conn.cursor(cursor_factory=DictCursor)
+            cursor.execute("SELECT * FROM pmo.resource_roles")
+            roles = cursor.fetchall()
 
-        # Convert rows to a list of dictionaries
-        roles = [dict(role) for role in roles]
+            # Convert rows to a list of dictionaries
+            roles = [dict(role) for role in roles]
 
-        cursor.close()
-        return roles  # Return as JSON
-    except psycopg2.Error as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        if conn:
-            release_pg_connection(conn)
\ No newline at end of file
+            cursor.close()
+            return roles  # Return as JSON
+        except psycopg2.Error as e:
+            raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
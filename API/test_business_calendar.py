@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('.')
+
+import numpy as np
+from datetime import date, timedelta
+from business_calendar import BusinessCalendar, TimeoffIndex, merge_ranges, period_bounds, period_offsets, period_sums
+
+def as_dates(values):
+    return [str(value) for value in values]
+
+def test_period_bounds_weekly():
+    # Wednesday to the Tuesday two weeks later: clamped first and last weeks
+    starts, ends = period_bounds(date(2026, 1, 7), date(2026, 1, 20), 'Weekly')
+    assert as_dates(starts) == ['2026-01-07', '2026-01-12', '2026-01-19']
+    assert as_dates(ends) == ['2026-01-11', '2026-01-18', '2026-01-20']
+
+def test_period_bounds_monthly_and_quarterly():
+    starts, ends = period_bounds(date(2026, 1, 15), date(2026, 3, 10), 'Monthly')
+    assert as_dates(starts) == ['2026-01-15', '2026-02-01', '2026-03-01']
+    assert as_dates(ends) == ['2026-01-31', '2026-02-28', '2026-03-10']
+    starts, ends = period_bounds(date(2026, 2, 10), date(2026, 8, 5), 'Quarterly')
+    assert as_dates(starts) == ['2026-02-10', '2026-04-01', '2026-07-01']
+    assert as_dates(ends) == ['2026-03-31', '2026-06-30', '2026-08-05']
+
+def test_period_bounds_empty_range():
+    starts, ends = period_bounds(date(2026, 2, 1), date(2026, 1, 31), 'Weekly')
+    assert len(starts) == 0 and len(ends) == 0
+
+def test_period_offsets_and_sums():
+    calendar = BusinessCalendar()
+    days = calendar.days(date(2026, 1, 1), date(2026, 3, 31))
+    starts, ends = period_bounds(date(2026, 1, 1), date(2026, 3, 31), 'Monthly')
+    offsets = period_offsets(days, starts)
+    assert offsets.tolist() == [0, 22, 42]
+
+    # Sums per period match a per-day loop, with trailing axes kept and booleans counted
+    values = np.arange(len(days) * 2).reshape(len(days), 2)
+    sums = period_sums(values, offsets)
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        in_period = (days >= start) & (days <= end)
+        assert sums[i].tolist() == values[in_period].sum(axis=0).tolist()
+    assert period_sums(np.ones(len(days), dtype=bool), offsets).tolist() == calendar.counts(starts, ends).tolist()
+
+def test_period_sums_empty_segments():
+    # A weekend-only week has no business days: its segment is empty and sums to 0
+    calendar = BusinessCalendar()
+    days = calendar.days(date(2026, 1, 3), date(2026, 1, 13))
+    starts, _ = period_bounds(date(2026, 1, 3), date(2026, 1, 13), 'Weekly')
+    offsets = period_offsets(days, starts)
+    assert offsets.tolist() == [0, 0, 5]
+    assert period_sums(np.ones(len(days), dtype=np.int64), offsets).tolist() == [0, 5, 2]
+    assert period_sums(np.ones(0), offsets).tolist() == [0, 0, 0]
+
+def test_merge_ranges():
+    starts, ends = merge_ranges([
+        (date(2026, 3, 10), date(2026, 3, 12)),
+        (date(2026, 3, 1), date(2026, 3, 5)),
+        (date(2026, 3, 6), date(2026, 3, 7)),    # touches the previous range
+        (date(2026, 3, 11), date(2026, 3, 11)),  # inside another range
+        (date(2026, 3, 20), date(2026, 3, 25))
+    ])
+    assert as_dates(starts) == ['2026-03-01', '2026-03-10', '2026-03-20']
+    assert as_dates(ends) == ['2026-03-07', '2026-03-12', '2026-03-25']
+
+def test_timeoff_index_merges_overlapping_rows():
+    calendar = BusinessCalendar(['2026-03-04'])
+    timeoffs = [
+        {'resource_id': 1, 'timeoff_start_date': date(2026, 3, 2), 'timeoff_end_date': date(2026, 3, 6)},
+        {'resource_id': 1, 'timeoff_start_date': date(2026, 3, 5), 'timeoff_end_date': date(2026, 3, 10)},
+        {'resource_id': 1, 'timeoff_start_date': date(2026, 3, 20), 'timeoff_end_date': date(2026, 3, 20)},
+        {'resource_id': 2, 'timeoff_start_date': date(2026, 3, 3), 'timeoff_end_date': None},
+        {'resource_id': 3, 'timeoff_start_date': date(2026, 3, 9), 'timeoff_end_date': date(2026, 3, 9)}
+    ]
+    index = TimeoffIndex(timeoffs, calendar)
+    assert as_dates(index.ranges[1][0]) == ['2026-03-02', '2026-03-20']
+    assert as_dates(index.ranges[1][1]) == ['2026-03-10', '2026-03-20']
+    assert 2 not in index.ranges
+
+    # Overlapping days count once and the holiday is not a business day
+    assert index.off_days(1, date(2026, 3, 1), date(2026, 3, 31)) == 7
+    assert index.off_days(1, date(2026, 3, 9), date(2026, 3, 19)) == 2
+    assert index.off_days(2, date(2026, 3, 1), date(2026, 3, 31)) == 0
+
+    days = calendar.days(date(2026, 3, 1), date(2026, 3, 31))
+    for resource_id in (1, 2, 3):
+        expected = [any(row['resource_id'] == resource_id and row['timeoff_end_date'] is not None
+                        and row['timeoff_start_date'] <= day <= row['timeoff_end_date'] for row in timeoffs)
+                    for day in days.astype(date)]
+        assert index.mask(resource_id, days).tolist() == expected
+        assert [index.is_off(resource_id, day) for day in days.astype(date)] == expected
+
+def test_business_calendar_counts():
+    calendar = BusinessCalendar(['2026-01-01', '2026-01-03'])  # the Saturday is ignored
+    assert calendar.holidays == [date(2026, 1, 1)]
+    assert calendar.count(date(2026, 1, 1), date(2026, 1, 31)) == 21
+    start = date(2025, 12, 20)
+    for span in range(20):
+        end = start + timedelta(days=span)
+        assert calendar.count(start, end) == len(calendar.days(start, end))
+    assert calendar.count(date(2026, 1, 5), date(2026, 1, 4)) == 0
+
+def main():
+    tests = [value for name, value in globals().items() if name.startswith('test_')]
+    for test in tests:
+        test()
+        print(f"{test.__name__}: OK")
+    print(f"\nAll {len(tests)} business calendar tests passed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('.')
+
+import random
+from fractions import Fraction
+from datetime import date, datetime, timedelta
+from business_calendar import business_calendar
+from capacity_allocation import compute_capacity_allocations
+
+######################################################################
+#      Reference: the original per-day loop of /resource_capacity_allocation in exact arithmetic
+######################################################################
+
+# Hours are summed exactly; as in the original route, round() applies to the float of each sum and percentages
+# divide those floats
+
+def round_hours(value, digits):
+    return round(float(value), digits)
+
+def percentage(hours, capacity):
+    return round(float(hours) / float(capacity) * 100, 2) if capacity > 0 else 0
+
+def project_order(project_id):
+    return (project_id is None, project_id or 0)
+
+def reference_days(resource, allocations, actuals, timeoffs, start, end):
+    daily_capacity = Fraction(resource['yearly_capacity']) / 261
+    days = []
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            planned, actual = {}, {}
+            for allocation in allocations:
+                if allocation['allocation_start_date'] <= day <= allocation['allocation_end_date']:
+                    if allocation['allocation_pct']:
+                        hours = daily_capacity * Fraction(str(allocation['allocation_pct'])) / 100
+                    else:
+                        hours = Fraction(str(allocation['allocation_hrs_per_week'] or 0)) / 5
+                    planned[allocation['project_id']] = planned.get(allocation['project_id'], 0) + hours
+            for row in actuals:
+                if row['ts_entry_date'] == day:
+                    actual[row['project_id']] = actual.get(row['project_id'], 0) + Fraction(str(row['allocation_hours_actual']))
+            used = sum(actual[p] if actual.get(p, 0) > 0 else planned.get(p, 0) for p in set(planned) | set(actual))
+            off = any(t['timeoff_start_date'] <= day <= t['timeoff_end_date'] for t in timeoffs)
+            capacity = 0 if off else daily_capacity
+            days.append({
+                "date": day,
+                "capacity": Fraction(capacity),
+                "planned_total": sum((v for k, v in planned.items() if k not in actual), Fraction(0)),
+                "actual_total": sum(actual.values(), Fraction(0)),
+                "available": capacity - (0 if off else used),
+                "planned": planned,
+                "actual": actual
+            })
+        day += timedelta(days=1)
+    return days
+
+def reference_details(planned, actual, capacity, names):
+    return [{
+        "project_id": project_id,
+        "project_name": names.get(project_id, "Unknown Project"),
+        "planned_hours": round_hours(planned.get(project_id, Fraction(0)), 2),
+        "actual_hours": round_hours(actual.get(project_id, Fraction(0)), 2),
+        "planned_percentage": percentage(planned.get(project_id, Fraction(0)), capacity),
+        "actual_percentage": percentage(actual.get(project_id, Fraction(0)), capacity)
+    } for project_id in sorted(set(planned) | set(actual), key=project_order)]
+
+def reference_period(days, start, end, names, weekly=False):
+    capacity = sum((day["capacity"] for day in days), Fraction(0))
+    planned, actual = {}, {}
+    for day in days:
+        for source, target in ((day["planned"], planned), (day["actual"], actual)):
+            for project_id, hours in source.items():
+                target[project_id] = target.get(project_id, 0) + hours
+    return {
+        "start_date": str(start),
+        "end_date": str(end),
+        "total_capacity": round_hours(capacity, 1),
+        "allocation_hours_planned": round_hours(sum((day["planned_total"] for day in days), Fraction(0)), 1),
+        "allocation_hours_actual": round_hours(sum((day["actual_total"] for day in days), Fraction(0)), 1),
+        "available_capacity": round_hours(sum((day["available"] for day in days), Fraction(0)), 1),
+        # Weekly percentages of a week without capacity divide by 0.001 hours
+        "project_allocation_details": reference_details(
+            planned, actual, capacity if capacity > 0 or not weekly else 0.001, names)
+    }
+
+def reference_blocks(days, names):
+    blocks = []
+    for day in days:
+        details = reference_details(day["planned"], day["actual"], day["capacity"], names)
+        signature = sorted((tuple(detail.items()) for detail in details), key=lambda items: str(items))
+        if blocks and blocks[-1]["signature"] == signature:
+            blocks[-1]["days"].append(day)
+            blocks[-1]["details"].append(details)
+        else:
+            blocks.append({"signature": signature, "days": [day], "details": [details]})
+
+    # Per-project block hours add the day-rounded floats in day order, and the totals the block-rounded ones
+    entries = []
+    for block in blocks:
+        capacity = float(sum((day["capacity"] for day in block["days"]), Fraction(0)))
+        totals = {}
+        for details in block["details"]:
+            for detail in details:
+                total = totals.setdefault(detail["project_id"], [detail["project_name"], 0.0, 0.0])
+                total[1] += detail["planned_hours"]
+                total[2] += detail["actual_hours"]
+        project_details = []
+        for project_id, (name, planned, actual) in totals.items():
+            planned, actual = round(planned, 1), round(actual, 1)
+            project_details.append({
+                "project_id": project_id,
+                "project_name": name,
+                "planned_hours": planned,
+                "actual_hours": actual,
+                "planned_percentage": percentage(planned, capacity),
+                "actual_percentage": percentage(actual, capacity)
+            })
+        planned = sum(detail["planned_hours"] for detail in project_details)
+        actual = sum(detail["actual_hours"] for detail in project_details)
+        entries.append({
+            "start_date": str(block["days"][0]["date"]),
+            "end_date": str(block["days"][-1]["date"]),
+            "total_capacity": round(capacity, 1),
+            "allocation_hours_planned": round(planned, 1),
+            "allocation_hours_actual": round(actual, 1),
+            "available_capacity": round(capacity - planned, 1),
+            "project_allocation_details": project_details
+        })
+    return entries
+
+def reference_capacity_allocation(resource, allocations, actuals, timeoffs, start, end, interval):
+    names = {row['project_id']: row['project_name'] for row in allocations + actuals if row['project_id'] and row['project_name']}
+    days = reference_days(resource, allocations, actuals, timeoffs, start, end)
+    if interval == 'Weekly':
+        entries = []
+        week_start = start
+        while week_start <= end:
+            week_end = min(week_start + timedelta(days=6 - week_start.weekday()), end)
+            week_days = [day for day in days if week_start <= day["date"] <= week_end]
+            entries.append(reference_period(week_days, week_start, week_end, names, weekly=True))
+            week_start = week_end + timedelta(days=7 - week_end.weekday())
+        return entries
+    if interval == 'Monthly':
+        months = sorted({(day["date"].year, day["date"].month) for day in days})
+        entries = []
+        for i, (year, month) in enumerate(months):
+            month_start = date(year, month, 1)
+            month_end = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+            month_days = [day for day in days if (day["date"].year, day["date"].month) == (year, month)]
+            entries.append(reference_period(month_days, start if i == 0 else month_start,
+                                            end if i == len(months) - 1 else month_end, names))
+        return entries
+    if interval == 'Daily':
+        return [reference_period([day], day["date"], day["date"], names) for day in days]
+    return reference_blocks(days, names)
+
+######################################################################
+#      Generated resources with rounding ties, time off, weekend and project-less entries
+######################################################################
+
+PROJECT_NAMES = {1: "Apollo", 2: "Borealis", 3: "Cygnus", 4: None}
+
+def generate_rows(rng, resource_ids, start, end):
+    span = (end - start).days
+    resources, allocations, actuals, timeoffs = [], [], [], []
+    for resource_id in resource_ids:
+        resources.append({
+            "resource_id": resource_id, "resource_name": f"Resource {resource_id}", "resource_email": f"r{resource_id}@example.com",
+            "resource_type": "Employee", "strategic_portfolio": "Portfolio", "product_line": "Line", "manager_name": None,
+            "manager_email": None, "resource_role": "Dev", "responsibility": None, "skillset": None, "comments": None,
+            "yearly_capacity": rng.choice([1566, 1664, 1740, 1800, 1827, 1957, 2000, 2080]), "timesheet_resource_name": None
+        })
+        for _ in range(rng.randint(0, 4)):
+            allocation_start = start + timedelta(days=rng.randint(-20, span))
+            allocation_end = allocation_start + timedelta(days=rng.randint(0, 90))
+            pct = rng.choice([None, None, 5, 12.5, 20, 25, 33.33, 37.5, 50, 100])
+            project_id = rng.choice([1, 2, 3, 4])
+            allocations.append({
+                "resource_id": resource_id, "project_id": project_id, "project_name": PROJECT_NAMES[project_id],
+                "allocation_start_date": allocation_start, "allocation_end_date": allocation_end, "allocation_pct": pct,
+                "allocation_hrs_per_week": None if pct else rng.choice([None, 1, 2.5, 7.5, 8, 12.5, 16.25, 22.5, 40])
+            })
+        for _ in range(rng.randint(0, 40)):
+            project_id = rng.choice([1, 2, 3, None])
+            actuals.append({
+                "resource_id": resource_id, "project_id": project_id, "project_name": PROJECT_NAMES.get(project_id),
+                "ts_entry_date": start + timedelta(days=rng.randint(0, span)),
+                "allocation_hours_actual": rng.choice([0, 0.25, 0.5, 1.15, 2, 3.75, 4, 6.5, 8])
+            })
+        for _ in range(rng.randint(0, 2)):
+            timeoff_start = start + timedelta(days=rng.randint(-5, span))
+            timeoffs.append({"resource_id": resource_id, "timeoff_start_date": timeoff_start,
+                             "timeoff_end_date": timeoff_start + timedelta(days=rng.randint(0, 12))})
+    # The allocations query returns one row per (project, day) with the hours summed
+    summed = {}
+    for row in actuals:
+        key = (row['resource_id'], row['project_id'], row['ts_entry_date'])
+        summed[key] = {**row, "allocation_hours_actual": summed[key]["allocation_hours_actual"] + row["allocation_hours_actual"]} if key in summed else row
+    return resources, allocations, list(summed.values()), timeoffs
+
+def as_output(entries):
+    # Exact reference values as the response's floats, project details in a fixed order
+    def convert(value):
+        return float(value) if isinstance(value, Fraction) else value
+    return [{
+        **{key: convert(value) for key, value in entry.items() if key != "project_allocation_details"},
+        "project_allocation_details": sorted(({key: convert(value) for key, value in detail.items()}
+                                              for detail in entry["project_allocation_details"]),
+                                             key=lambda detail: (detail["project_id"] is None, detail["project_id"] or 0))
+    } for entry in entries]
+
+def check_interval(interval, seed=11, start=date(2026, 1, 3), end=date(2026, 7, 15)):
+    assert not business_calendar.holidays, "the reference loop has no holidays (unset PMO_BUSINESS_HOLIDAYS)"
+    rng = random.Random(seed)
+    resources, allocations, actuals, timeoffs = generate_rows(rng, range(1, 31), start, end)
+    results = compute_capacity_allocations(resources, str(start), str(end), interval, None, timeoffs, allocations, actuals)
+    for resource in resources:
+        resource_id = resource['resource_id']
+        rows = [[row for row in table if row['resource_id'] == resource_id] for table in (allocations, actuals, timeoffs)]
+        expected = as_output(reference_capacity_allocation(resource, *rows, start, end, interval))
+        response = results[resource_id]
+        assert response["resource_details"]["resource_id"] == resource_id
+        assert as_output(response["data"]) == expected, f"resource {resource_id}, interval {interval!r}"
+    return len(resources)
+
+def test_weekly_matches_reference():
+    check_interval('Weekly')
+
+def test_monthly_matches_reference():
+    check_interval('Monthly')
+    # A range starting and ending mid-month, on a weekend
+    check_interval('Monthly', seed=12, start=date(2026, 2, 14), end=date(2026, 5, 17))
+
+def test_blocks_match_reference():
+    check_interval('')
+    check_interval('', seed=13, start=date(2026, 3, 2), end=date(2026, 3, 31))
+
+def test_daily_matches_reference():
+    check_interval('Daily', start=date(2026, 2, 1), end=date(2026, 3, 31))
+
+def main():
+    tests = [value for name, value in globals().items() if name.startswith('test_')]
+    for test in tests:
+        test()
+        print(f"{test.__name__}: OK")
+    print(f"\nAll {len(tests)} capacity allocation tests passed.")
+
+if __name__ == "__main__":
+    main()
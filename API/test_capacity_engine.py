@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('.')
+
+import numpy as np
+from datetime import date
+from capacity_engine import run_lengths, fold_columns, interval_mask, to_units, to_hours, HOUR_UNITS
+
+def test_run_lengths_of_keys():
+    assert run_lengths([]) == []
+    assert run_lengths(['a']) == [(0, 1)]
+    assert run_lengths(['a', 'a', 'b', 'a', 'a', 'a']) == [(0, 2), (2, 3), (3, 6)]
+    # Hashable tuples, e.g. per-day detail signatures
+    assert run_lengths([(1, 2.5), (1, 2.5), (1, 3.0)]) == [(0, 2), (2, 3)]
+
+def test_run_lengths_of_array_rows():
+    signatures = np.array([[1, 0], [1, 0], [1, 1], [1, 1], [0, 0]])
+    assert run_lengths(signatures) == [(0, 2), (2, 4), (4, 5)]
+    assert run_lengths(np.array([3, 3, 3])) == [(0, 3)]
+    assert run_lengths(np.zeros((0, 4))) == []
+
+def test_interval_mask():
+    days = np.array(['2026-01-05', '2026-01-06', '2026-01-07', '2026-01-08'], dtype='datetime64[D]')
+    rows = [
+        {'start': date(2026, 1, 6), 'end': date(2026, 1, 7)},
+        {'start': date(2025, 12, 1), 'end': date(2026, 1, 5)},
+        {'start': date(2026, 1, 8), 'end': None},   # open range matches no day
+        {'start': date(2026, 2, 1), 'end': date(2026, 2, 5)}
+    ]
+    mask = interval_mask(days, rows, 'start', 'end')
+    assert mask.shape == (4, 4)
+    assert mask.T.tolist() == [
+        [False, True, True, False],
+        [True, False, False, False],
+        [False, False, False, False],
+        [False, False, False, False]
+    ]
+
+def test_fold_columns():
+    matrix = np.array([
+        [1, 2, 3, 4],
+        [5, 6, 7, 8]
+    ])
+    keys, folded = fold_columns(matrix, [2, 0, 2, 1], np.add)
+    assert keys.tolist() == [0, 1, 2]
+    assert folded.tolist() == [[2, 4, 4], [6, 8, 12]]
+
+    covered = np.array([
+        [True, False, False],
+        [False, False, True]
+    ])
+    keys, folded = fold_columns(covered, [1, 1, 0], np.logical_or)
+    assert keys.tolist() == [0, 1]
+    assert folded.tolist() == [[False, True], [True, False]]
+
+def test_fold_columns_of_interval_mask():
+    # Two allocations of one project over overlapping ranges add up on the shared days
+    days = np.array(['2026-01-05', '2026-01-06', '2026-01-07'], dtype='datetime64[D]')
+    allocations = [
+        {'allocation_start_date': date(2026, 1, 5), 'allocation_end_date': date(2026, 1, 6), 'project_id': 7},
+        {'allocation_start_date': date(2026, 1, 6), 'allocation_end_date': date(2026, 1, 7), 'project_id': 7},
+        {'allocation_start_date': date(2026, 1, 7), 'allocation_end_date': date(2026, 1, 7), 'project_id': 3}
+    ]
+    covered = interval_mask(days, allocations, 'allocation_start_date', 'allocation_end_date')
+    hours = np.array([2.0, 1.5, 8.0])
+    keys, planned = fold_columns(covered * hours, [a['project_id'] for a in allocations], np.add)
+    assert keys.tolist() == [3, 7]
+    assert planned.tolist() == [[0.0, 2.0], [0.0, 3.5], [8.0, 1.5]]
+
+def test_fixed_point_units():
+    # A daily capacity (yearly / 261) and a percentage of it are whole numbers of units
+    assert to_units(2080 / 261) == 2080 * 10 ** 6
+    assert int(to_units(2080 / 261)) * 375 % 10000 == 0  # 3.75% of it
+    assert to_units([0.1] * 3).sum() == to_units(0.3)
+    assert to_hours(int(to_units(12.5))) == 12.5
+    assert HOUR_UNITS % 100 == 0
+
+def main():
+    tests = [value for name, value in globals().items() if name.startswith('test_')]
+    for test in tests:
+        test()
+        print(f"{test.__name__}: OK")
+    print(f"\nAll {len(tests)} capacity engine tests passed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('.')
+
+import asyncio
+from starlette.responses import JSONResponse
+from utils import json_array_chunks, json_stream_response, json_stream_response_async
+
+class FakeCursor:
+    """
+    Stands in for a named cursor leased with a connection: counts the rows read and whether the lease was released.
+    """
+
+    def __init__(self, count):
+        self.count = count
+        self.read = 0
+        self.released = False
+
+    def rows(self):
+        try:
+            for i in range(self.count):
+                self.read += 1
+                yield {"id": i, "name": f"résource {i}", "hours": i * 1.5, "comment": None}
+        finally:
+            self.released = True
+
+    async def rows_async(self):
+        for row in self.rows():
+            yield row
+
+def test_chunks_encode_like_json_response():
+    for count in (0, 1, 2, 3, 7):
+        rows = list(FakeCursor(count).rows())
+        for batch_size in (1, 2, 3, 10):
+            body = b"".join(json_array_chunks(rows, batch_size))
+            assert body == JSONResponse(rows).body, (count, batch_size)
+
+def test_rows_emitted_before_cursor_exhausted():
+    async def run():
+        cursor = FakeCursor(10)
+        response = json_stream_response(cursor.rows(), batch_size=3)
+        # The first batch is read before the response is returned; the rest stays on the cursor
+        assert cursor.read == 3 and not cursor.released
+        chunks = []
+        async for chunk in response.body_iterator:
+            chunks.append(chunk)
+            if len(chunks) == 1:
+                assert chunk == ('[{"id":0,"name":"résource 0","hours":0.0,"comment":null},'
+                                 '{"id":1,"name":"résource 1","hours":1.5,"comment":null},'
+                                 '{"id":2,"name":"résource 2","hours":3.0,"comment":null}').encode()
+            if len(chunks) == 2:
+                assert cursor.read == 6 and not cursor.released
+        assert cursor.read == 10 and cursor.released
+        assert chunks[-1] == b"]" and len(chunks) == 5
+
+    asyncio.run(run())
+
+def test_async_rows_emitted_before_cursor_exhausted():
+    async def run():
+        cursor = FakeCursor(5)
+        response = await json_stream_response_async(cursor.rows_async(), batch_size=2)
+        assert cursor.read == 2 and not cursor.released
+        chunks = []
+        async for chunk in response.body_iterator:
+            chunks.append(chunk)
+            if len(chunks) == 2:
+                assert cursor.read == 4 and not cursor.released
+        assert cursor.released
+        assert b"".join(chunks) == JSONResponse(list(FakeCursor(5).rows())).body
+
+        empty = await json_stream_response_async(FakeCursor(0).rows_async())
+        assert [chunk async for chunk in empty.body_iterator] == [b"[]"]
+
+    asyncio.run(run())
+
+def test_errors_raise_before_the_response():
+    def failing_rows():
+        raise RuntimeError("query failed")
+        yield
+    try:
+        json_stream_response(failing_rows())
+    except RuntimeError as e:
+        assert str(e) == "query failed"
+    else:
+        raise AssertionError("the error should surface while the route can still answer with an error status")
+
+def main():
+    tests = [value for name, value in globals().items() if name.startswith('test_')]
+    for test in tests:
+        test()
+        print(f"{test.__name__}: OK")
+    print(f"\nAll {len(tests)} JSON stream tests passed.")
+
+if __name__ == "__main__":
+    main()
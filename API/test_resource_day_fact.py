@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('.')
+
+from datetime import date, timedelta
+from resource_day_fact import changed_windows
+
+def covered_days(windows):
+    days = set()
+    for _, start, end in windows:
+        days.update(start + timedelta(days=i) for i in range((end - start).days + 1))
+    return days
+
+def range_days(start, end):
+    return covered_days([(None, start, end)])
+
+def test_changed_windows_disjoint_ranges():
+    windows = changed_windows(4, '2026-01-05', '2026-01-09', '2026-02-02', '2026-02-06')
+    assert windows == [(4, date(2026, 1, 5), date(2026, 1, 9)), (4, date(2026, 2, 2), date(2026, 2, 6))]
+
+def test_changed_windows_moved_start_and_end():
+    # Shifted right: the days dropped at the start and the days added at the end
+    windows = changed_windows(4, date(2026, 1, 5), date(2026, 1, 16), date(2026, 1, 8), date(2026, 1, 20))
+    assert windows == [(4, date(2026, 1, 5), date(2026, 1, 7)), (4, date(2026, 1, 17), date(2026, 1, 20))]
+    # Shrunk at the end only
+    assert changed_windows(4, '2026-01-05', '2026-01-16', '2026-01-05', '2026-01-12') == [(4, date(2026, 1, 13), date(2026, 1, 16))]
+    # Unchanged: nothing to refresh
+    assert changed_windows(4, '2026-01-05', '2026-01-16', '2026-01-05', '2026-01-16') == []
+
+def test_changed_windows_cover_symmetric_difference():
+    # Accepts dates and date or datetime strings alike; the windows are exactly the days in one range only
+    base = date(2026, 3, 1)
+    for old_start, old_end, new_start, new_end in [(0, 10, 3, 7), (3, 7, 0, 10), (0, 5, 6, 9), (0, 5, 5, 9), (4, 4, 0, 8), (2, 9, 2, 3)]:
+        old = (base + timedelta(days=old_start), base + timedelta(days=old_end))
+        new = (base + timedelta(days=new_start), base + timedelta(days=new_end))
+        windows = changed_windows(1, f"{old[0]} 00:00:00", old[1], new[0].isoformat(), new[1])
+        assert covered_days(windows) == range_days(*old) ^ range_days(*new)
+        assert all(start <= end and resource_id == 1 for resource_id, start, end in windows)
+
+def main():
+    tests = [value for name, value in globals().items() if name.startswith('test_')]
+    for test in tests:
+        test()
+        print(f"{test.__name__}: OK")
+    print(f"\nAll {len(tests)} resource day fact tests passed.")
+
+if __name__ == "__main__":
+    main()
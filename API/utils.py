@@ -1,5 +1,49 @@
+import os
+import json
 from decimal import Decimal
 from datetime import date
+from itertools import chain, islice
+from starlette.responses import StreamingResponse
+
+# Rows encoded per chunk of a streamed JSON array response
+JSON_STREAM_BATCH_SIZE = int(os.environ.get("PMO_JSON_STREAM_BATCH_SIZE", 500))
+
+class Record(tuple):
+    """
+    Lightweight row: a tuple that also supports row['column'] and row.get('column') through a per-query column index.
+    Build one with record_class(columns)(values); convert with as_dict() (or dict(row)) at the serialization boundary.
+    """
+    __slots__ = ()
+    _columns = ()
+    _index = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        index = self._index.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+
+    def keys(self):
+        return self._index.keys()
+
+    def as_dict(self):
+        return dict(zip(self._columns, self))
+
+_record_classes = {}
+
+def record_class(columns):
+    """
+    Record subclass for a column list, cached per distinct list. Duplicate column names resolve to the last one, as in dict rows.
+    """
+    columns = tuple(columns)
+    cls = _record_classes.get(columns)
+    if cls is None:
+        index = {name: position for position, name in enumerate(columns)}
+        cls = _record_classes[columns] = type("Record", (Record,), {"__slots__": (), "_columns": columns, "_index": index})
+    return cls
 
 def convert_decimal_to_float(data):
     """
@@ -8,6 +52,8 @@ def convert_decimal_to_float(data):
     """
     if isinstance(data, list):
         return [convert_decimal_to_float(item) for item in data]
+    elif isinstance(data, Record):
+        return {key: convert_decimal_to_float(value) for key, value in zip(data._columns, data)}
     elif isinstance(data, dict):
         return {key: convert_decimal_to_float(value) for key, value in data.items()}
     elif isinstance(data, Decimal):
@@ -18,3 +64,59 @@ def convert_decimal_to_float(data):
         return None
     else:
         return data
+
+def encode_json(data):
+    # Same encoding as JSONResponse
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def json_array_chunks(rows, batch_size=None):
+    """
+    Encode an iterable of JSON-serializable rows as a JSON array, yielding one chunk per `batch_size` rows.
+    The opening bracket goes out with the first batch, so the first chunk is only produced once rows (or their end) arrive.
+    """
+    rows = iter(rows)
+    separator = b"["
+    while True:
+        batch = list(islice(rows, batch_size or JSON_STREAM_BATCH_SIZE))
+        if not batch:
+            break
+        yield separator + encode_json(batch)[1:-1]
+        separator = b","
+    yield b"[]" if separator == b"[" else b"]"
+
+async def json_array_chunks_async(rows, batch_size=None):
+    # json_array_chunks over an async iterable
+    batch_size = batch_size or JSON_STREAM_BATCH_SIZE
+    separator = b"["
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield separator + encode_json(batch)[1:-1]
+            separator, batch = b",", []
+    if batch:
+        yield separator + encode_json(batch)[1:-1]
+        separator = b","
+    yield b"[]" if separator == b"[" else b"]"
+
+def json_stream_response(rows, batch_size=None):
+    """
+    StreamingResponse sending `rows` as a JSON array while they are read.
+    The first batch is read before returning, so the query runs (and its errors raise) while the route can still answer
+    with an error status. A generator that leases a connection keeps it until the last row is sent or the response is dropped.
+    """
+    chunks = json_array_chunks(rows, batch_size)
+    first = next(chunks)
+    return StreamingResponse(chain([first], chunks), media_type="application/json")
+
+async def json_stream_response_async(rows, batch_size=None):
+    # json_stream_response over an async iterable
+    chunks = json_array_chunks_async(rows, batch_size)
+    first = await anext(chunks)
+
+    async def body():
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+    return StreamingResponse(body(), media_type="application/json")